@@ -0,0 +1,202 @@
+"""
+End-to-end benchmark of the board cycle against local stand-ins of
+GitHub, Jira and Miro, no real service is called. Every cycle is a call
+of main.create_miro_boards.
+
+Reports the wall time and the requests per service of every cycle and the
+peak memory of the process.
+
+Usage:
+    python benchmarks/board_cycle_benchmark.py --repos 100 --commits 1000
+    python benchmarks/board_cycle_benchmark.py --latency-ms 50 \\
+        --rate-limit-every 20 --backend graphql
+    python benchmarks/board_cycle_benchmark.py --boards 4
+    python benchmarks/board_cycle_benchmark.py --repos 200 --shards 4
+    python benchmarks/board_cycle_benchmark.py --render-backend offline \\
+        --replay
+"""
+import argparse
+import collections
+import glob
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from mock_services import MockServices, SyntheticOrg  # noqa
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repos', type=int, default=20,
+                        help='repos of the synthetic org, up to 1000')
+    parser.add_argument('--commits', type=int, default=50,
+                        help='max commits per branch pair, up to 10000')
+    parser.add_argument('--pull-requests', type=int, default=3,
+                        help='open pull requests per repo')
+    parser.add_argument('--cycles', type=int, default=2,
+                        help='board cycles, the first one is cold')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='latency added to every mocked request')
+    parser.add_argument('--rate-limit-every', type=int, default=0,
+                        help='answer every Nth Miro request with 429')
+    parser.add_argument('--backend', default='rest',
+                        choices=['rest', 'graphql'])
+    parser.add_argument('--change-detection', action='store_true',
+                        help='fetch only the repos whose branch heads or '
+                             'open pull requests moved')
+    parser.add_argument('--boards', type=int, default=1,
+                        help='boards showing all the repos, rendered from '
+                             'the same fetches')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='split the repos of every board in shards, '
+                             'rendered concurrently into their regions')
+    parser.add_argument('--render-backend', default='miro',
+                        choices=['miro', 'offline'],
+                        help='offline writes the board plans to files, '
+                             'the cycles make no Miro request')
+    parser.add_argument('--replay', action='store_true',
+                        help='push the board plans of the last offline '
+                             'cycle to Miro')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='report the peak Python heap, slows down '
+                             'the cycles')
+
+    return parser.parse_args()
+
+
+def configure_environment(args, url, state_dir):
+    os.environ.update({
+        "REPOS": ",".join(f"repo-{i:04d}" for i in range(args.repos)),
+        "GITHUB_OWNER": "org",
+        "GITHUB_API_TOKEN": "token",
+        "GITHUB_API_URL": url + "/github",
+        "GITHUB_BACKEND": args.backend,
+        "JIRA_API_URL": url + "/jira",
+        "JIRA_USERNAME": "user",
+        "JIRA_API_TOKEN": "token",
+        "JIRA_BROWSE_URL": url + "/jira/browse",
+        "MIRO_API_URL": url + "/miro",
+        "MIRO_API_TOKEN": "token",
+        "MIRO_BOARD_ID": "board",
+        "MIRO_BACKOFF_MAX_SECONDS": "2",
+        "BOARD_STATE_FILE": os.path.join(state_dir, "board-state.json"),
+        "RENDER_BACKEND": args.render_backend,
+        "RENDER_OUTPUT_DIR": os.path.join(state_dir, "plans"),
+    })
+
+    for name in ("JIRA_CACHE_FILE", "GITHUB_CACHE_DIR"):
+        os.environ.pop(name, None)
+
+
+def requests_per_service(stats):
+    per_service = collections.Counter()
+    rate_limited = 0
+
+    for key, count in stats.items():
+        service, _, status = key.split(' ')
+        per_service[service] += count
+
+        if status == '429':
+            rate_limited += count
+
+    return per_service, rate_limited
+
+
+def main():
+    args = parse_args()
+
+    org = SyntheticOrg(max_commits=args.commits,
+                       pull_requests=args.pull_requests)
+
+    services = MockServices(org, port=args.port,
+                            latency_seconds=args.latency_ms / 1000,
+                            rate_limit_every=args.rate_limit_every).start()
+
+    state_dir = tempfile.mkdtemp(prefix='board-benchmark-')
+    configure_environment(args, services.url, state_dir)
+
+    import config
+    import main as board
+    from render_backends import replay_board_plans
+    from board_config import BoardConfig, shard_board_config
+    from repo_change_detector import RepoChangeDetector
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    print(f"repos: {args.repos}, max commits: {args.commits}, "
+          f"latency: {args.latency_ms}ms, backend: {args.backend}, "
+          f"boards: {args.boards}, shards: {args.shards}, "
+          f"render backend: {args.render_backend}")
+
+    boards = [BoardConfig(f"board-{i}", config.REPOS, config.BRANCHES,
+                          state_file=os.path.join(state_dir,
+                                                  f"board-{i}.json"))
+              for i in range(args.boards)]
+
+    if args.shards > 1:
+        boards = [shard_board_config(board_config, shard_index, args.shards)
+                  for board_config in boards
+                  for shard_index in range(args.shards)]
+
+    change_detector = RepoChangeDetector(
+            config.BRANCHES, 0, config.REPO_POLL_MAX_SECONDS) \
+        if args.change_detection else None
+
+    board_data = None
+
+    try:
+        for cycle in range(args.cycles):
+            services.reset_stats()
+
+            started_at = time.perf_counter()
+            board_data = board.create_miro_boards(
+                    boards, board_data, change_detector)
+            wall_seconds = time.perf_counter() - started_at
+
+            per_service, rate_limited = requests_per_service(
+                    services.stats())
+
+            print(f"cycle {cycle}: {wall_seconds:.2f}s, "
+                  f"github: {per_service['github']}, "
+                  f"jira: {per_service['jira']}, "
+                  f"miro: {per_service['miro']}, "
+                  f"429: {rate_limited}")
+
+        if args.replay and args.render_backend == 'offline':
+            services.reset_stats()
+
+            started_at = time.perf_counter()
+            replay_board_plans(sorted(glob.glob(
+                    os.path.join(config.RENDER_OUTPUT_DIR, "*.json"))))
+            wall_seconds = time.perf_counter() - started_at
+
+            per_service, rate_limited = requests_per_service(
+                    services.stats())
+
+            print(f"replay: {wall_seconds:.2f}s, "
+                  f"miro: {per_service['miro']}, 429: {rate_limited}")
+    finally:
+        services.stop()
+
+    # kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS: {peak_rss_mb:.1f}MB")
+
+    if args.tracemalloc:
+        _, peak_heap = tracemalloc.get_traced_memory()
+        print(f"peak Python heap: {peak_heap / 1024 / 1024:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
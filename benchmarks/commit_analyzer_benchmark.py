@@ -0,0 +1,99 @@
+"""
+Microbenchmark of the commit messages analysis.
+
+Compares the single pass analyzer with the previous multi pass approach
+(join + regex, then a commits x tickets substring scan, then the merge
+commits filter) on synthetic compares of growing size.
+
+Usage: python benchmarks/commit_analyzer_benchmark.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from commit_analyzer import analyze_commit_messages, truncate_line  # noqa
+
+SIZES = [1000, 10000, 100000]
+
+REPEATS = 3
+
+
+def generate_commit_messages(count, seed=42):
+    rnd = random.Random(seed)
+
+    commit_messages = []
+    for i in range(count):
+        kind = rnd.random()
+
+        if kind < 0.1:
+            commit_messages.append(f"Merge pull request #{i} from org/b{i}")
+        elif kind < 0.3:
+            commit_messages.append(f"Fix typo in the readme {i}")
+        else:
+            commit_messages.append(
+                    f"ABC-{rnd.randint(1, count)} Implement the feature "
+                    f"number {i} with a reasonably long description line")
+
+    return commit_messages
+
+
+def legacy_analyze_commit_messages(commit_messages):
+    ticket_ids = sorted(set(
+            ticket_id for ticket_id in
+            re.findall(r'[A-Z]+-\d+', ' '.join(commit_messages))
+            if 'LITE-000' not in ticket_id))
+
+    commit_msgs = [truncate_line(commit_message)
+                   for commit_message in commit_messages
+                   if not any(ticket_id in commit_message
+                              for ticket_id in ticket_ids)]
+
+    has_commit_msgs = len(commit_msgs) > 0
+    commit_msgs = [msg for msg in commit_msgs if 'pull request #' not in msg]
+
+    if len(commit_msgs) == 0 and has_commit_msgs:
+        commit_msgs = ['...']
+
+    return ticket_ids, commit_msgs
+
+
+def measure(func, commit_messages):
+    best = float('inf')
+
+    for _ in range(REPEATS):
+        started_at = time.perf_counter()
+        func(commit_messages)
+        best = min(best, time.perf_counter() - started_at)
+
+    return best
+
+
+def main():
+    print(f"{'commits':>10} {'analyzer s':>12} {'us/commit':>10} "
+          f"{'legacy s':>10} {'us/commit':>10}")
+
+    for size in SIZES:
+        commit_messages = generate_commit_messages(size)
+        commits = [(commit_message, "dev")
+                   for commit_message in commit_messages]
+
+        analyzer_seconds = measure(analyze_commit_messages, commits)
+
+        # the legacy scan is quadratic, do not wait minutes for it
+        legacy_seconds = measure(legacy_analyze_commit_messages,
+                                 commit_messages) if size <= 10000 else None
+
+        legacy_text = f"{legacy_seconds:>10.3f} " \
+                      f"{legacy_seconds / size * 1e6:>10.1f}" \
+            if legacy_seconds is not None else f"{'-':>10} {'-':>10}"
+
+        print(f"{size:>10} {analyzer_seconds:>12.3f} "
+              f"{analyzer_seconds / size * 1e6:>10.1f} {legacy_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+"""
+Local stand-ins of the GitHub, Jira and Miro endpoints used by a board
+cycle, serving a synthetic organization.
+
+The server runs in its own process, so its memory and CPU are not mixed
+with the measured process. The request counters are read and reset over
+HTTP with GET /_stats and POST /_reset.
+"""
+import collections
+import hashlib
+import itertools
+import json
+import multiprocessing
+import re
+import threading
+import time
+import urllib.request
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+GRAPHQL_FIELD_PATTERN = re.compile(
+        r'(\w+): repository\(owner: "[^"]*", name: "([^"]*)"\) \{ f: '
+        r'(?:ref\(qualifiedName: "refs/heads/([^"]*)"\) \{ '
+        r'compare\(headRef: "([^"]*)"\) \{ aheadBy '
+        r'commits\(first: (\d+)(?:, after: "([^"]*)")?\)'
+        r'|pullRequests\(states: OPEN, baseRefName: "[^"]*", '
+        r'first: (\d+)(?:, after: "([^"]*)")?\))')
+
+GRAPHQL_HEADS_REPO_PATTERN = re.compile(
+        r'(\w+): repository\(owner: "[^"]*", name: "([^"]*)"\) \{ b0: ')
+
+GRAPHQL_HEAD_PATTERN = re.compile(
+        r'(b\d+): ref\(qualifiedName: "refs/heads/([^"]*)"\) \{ target')
+
+GRAPHQL_OPEN_PRS_PATTERN = re.compile(
+        r'(prs\d+): pullRequests\(states: OPEN, ')
+
+TICKET_ID_PATTERN = re.compile(r'[A-Z]+-\d+')
+
+COMMIT_AUTHORS = 4
+
+
+class SyntheticOrg:
+    """
+    Deterministic content of the mocked services.
+
+    :param max_commits: max commits of a branch pair, the actual number
+                        is spread between 0 and this value
+    :param pull_requests: open pull requests per repo
+    :param tickets: number of Jira tickets referenced by the commits
+    """
+
+    def __init__(self, max_commits=50, pull_requests=3, tickets=500):
+        self.max_commits = max_commits
+        self.pull_requests = pull_requests
+        self.tickets = tickets
+
+    @staticmethod
+    def _seed(*values):
+        return zlib.crc32('/'.join(map(str, values)).encode())
+
+    def commits_count(self, repo, base_branch, compare_branch):
+        return self._seed(repo, base_branch, compare_branch) % \
+            (self.max_commits + 1)
+
+    def commit_messages(self, repo, base_branch, compare_branch, start=0,
+                        stop=None):
+        """
+        Only the requested page is generated, the big compares are never
+        kept in memory.
+
+        :return: list of commit message and author login
+        """
+        count = self.commits_count(repo, base_branch, compare_branch)
+
+        commit_messages = []
+        for i in range(start, min(count, stop or count)):
+            seed = self._seed(repo, base_branch, i)
+            author = f"dev{seed // 10 % COMMIT_AUTHORS}"
+
+            if seed % 10 == 0:
+                commit_messages.append(
+                        (f"Merge pull request #{i} from org/b", author))
+            elif seed % 10 == 1:
+                commit_messages.append((f"Bump the dependencies {i}", author))
+            else:
+                commit_messages.append(
+                        (f"ABC-{seed % self.tickets + 1} Change {i} "
+                         f"of {repo}", author))
+
+        return commit_messages
+
+    def head_oid(self, repo, branch):
+        return f"{self._seed(repo, branch):040x}"
+
+    def pull_request_titles(self, repo):
+        return [f"ABC-{self._seed(repo, i) % self.tickets + 1} PR {i}"
+                for i in range(self.pull_requests)]
+
+    def ticket(self, ticket_id):
+        number = int(ticket_id.split('-')[1])
+
+        if not ticket_id.startswith('ABC-') or number > self.tickets:
+            return None
+
+        return {"key": ticket_id, "id": str(number),
+                "fields": {"summary": f"Ticket {number} title",
+                           "status": {"name": "In Progress"},
+                           "updated": "2020-01-01T00:00:00.000+0000"}}
+
+
+class MockState:
+
+    def __init__(self, org, latency_seconds, rate_limit_every):
+        self.org = org
+        self.latency_seconds = latency_seconds
+        self.rate_limit_every = rate_limit_every
+
+        # board id to its items and connectors
+        self.boards = collections.defaultdict(lambda: ({}, {}))
+        self.ids = itertools.count(1000)
+        self.requests = collections.Counter()
+        self.miro_requests = 0
+        self.lock = threading.Lock()
+
+    def count(self, service, method, status):
+        with self.lock:
+            self.requests[f"{service} {method} {status}"] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, service, status, body=None, headers=None):
+        data = b"" if body is None else json.dumps(body).encode()
+
+        if status == 200 and self.command == "GET" and service == "github":
+            etag = '"%s"' % hashlib.sha1(data).hexdigest()
+            headers = dict(headers or {}, ETag=etag)
+
+            if self.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+
+        self.state.count(service, self.command, status)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def do_PATCH(self):
+        self.handle_request()
+
+    def do_DELETE(self):
+        self.handle_request()
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        path, query = url.path, parse_qs(url.query)
+
+        if path == "/_stats":
+            with self.state.lock:
+                body = json.dumps(self.state.requests).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if path == "/_reset":
+            with self.state.lock:
+                self.state.requests.clear()
+            self.send_response(204)
+            self.end_headers()
+            return
+
+        if self.state.latency_seconds:
+            time.sleep(self.state.latency_seconds)
+
+        if path.startswith("/github/"):
+            self.handle_github(path, query)
+        elif path.startswith("/jira/"):
+            self.handle_jira(path, query)
+        elif path.startswith("/miro/"):
+            self.handle_miro(path, query)
+        else:
+            self.send_json("unknown", 404, {"path": path})
+
+    def handle_github(self, path, query):
+        org = self.state.org
+
+        if path == "/github/graphql":
+            return self.send_json("github", 200, {
+                "data": self.graphql_data(self.read_json()["query"])})
+
+        match = re.match(r"/github/repos/[^/]+/([^/]+)/compare/(.+)\.\.\.(.+)$",
+                         path)
+        if match:
+            repo, base_branch, compare_branch = match.groups()
+
+            per_page = int(query.get("per_page", ["250"])[0])
+            page = int(query.get("page", ["1"])[0])
+            page_messages = org.commit_messages(
+                    repo, base_branch, compare_branch,
+                    (page - 1) * per_page, page * per_page)
+
+            return self.send_json("github", 200, {
+                "total_commits": org.commits_count(repo, base_branch,
+                                                   compare_branch),
+                "commits": [{"commit": {"message": message,
+                                        "author": {"name": author}},
+                             "author": {"login": author}}
+                            for message, author in page_messages]})
+
+        match = re.match(r"/github/repos/[^/]+/([^/]+)/pulls$", path)
+        if match:
+            return self.send_json("github", 200, [
+                {"title": title, "html_url": "https://github.com/pr",
+                 "user": {"login": "dev"}}
+                for title in org.pull_request_titles(match.group(1))])
+
+        self.send_json("github", 404, {"message": "Not Found"})
+
+    def graphql_data(self, graphql_query):
+        org = self.state.org
+        data = {}
+
+        for match in GRAPHQL_FIELD_PATTERN.finditer(graphql_query):
+            alias, repo, compare_branch, base_branch, first, after, \
+                pr_first, pr_after = match.groups()
+
+            if compare_branch is not None:
+                start, first = int(after or 0), int(first)
+                count = org.commits_count(repo, base_branch, compare_branch)
+                nodes = [{"message": message,
+                          "author": {"name": author,
+                                     "user": {"login": author}}}
+                         for message, author in
+                         org.commit_messages(repo, base_branch,
+                                             compare_branch, start,
+                                             start + first)]
+                data[alias] = {"f": {"compare": {
+                    "aheadBy": count,
+                    "commits": {
+                        "nodes": nodes,
+                        "pageInfo": {"hasNextPage": start + first < count,
+                                     "endCursor": str(start + first)}}}}}
+            else:
+                nodes = [{"title": title, "url": "https://github.com/pr",
+                          "author": {"login": "dev"}}
+                         for title in org.pull_request_titles(repo)]
+                data[alias] = {"f": self.graphql_page(nodes, int(pr_first),
+                                                      pr_after)}
+
+        heads = GRAPHQL_HEAD_PATTERN.findall(graphql_query)
+        prs_aliases = set(GRAPHQL_OPEN_PRS_PATTERN.findall(graphql_query))
+
+        for alias, repo in GRAPHQL_HEADS_REPO_PATTERN.findall(graphql_query):
+            repository = {
+                head_alias: {"target": {"oid": org.head_oid(repo, branch)}}
+                for head_alias, branch in heads}
+
+            titles = org.pull_request_titles(repo)
+            for prs_alias in prs_aliases:
+                repository[prs_alias] = {
+                    "totalCount": len(titles),
+                    "nodes": [{"number": i, "title": title}
+                              for i, title in enumerate(titles)]}
+
+            data[alias] = repository
+
+        return data
+
+    @staticmethod
+    def graphql_page(nodes, first, after):
+        start = int(after or 0)
+
+        return {"nodes": nodes[start:start + first],
+                "pageInfo": {"hasNextPage": start + first < len(nodes),
+                             "endCursor": str(start + first)}}
+
+    def handle_jira(self, path, query):
+        org = self.state.org
+
+        if path.startswith("/jira/rest/api/2/serverInfo"):
+            return self.send_json("jira", 200, {
+                "version": "1001.0.0", "versionNumbers": [1001, 0, 0],
+                "deploymentType": "Cloud"})
+
+        if path.startswith("/jira/rest/api/2/field"):
+            return self.send_json("jira", 200, [
+                {"id": "summary", "name": "Summary"},
+                {"id": "status", "name": "Status"}])
+
+        match = re.match(r"/jira/rest/api/2/issue/([A-Z]+-\d+)", path)
+        if match:
+            issue = org.ticket(match.group(1))
+
+            if issue is None:
+                return self.send_json("jira", 404, {
+                    "errorMessages": ["Issue does not exist"]})
+
+            return self.send_json("jira", 200, issue)
+
+        if path.startswith("/jira/rest/api/2/search"):
+            body = self.read_json() if self.command == "POST" else None
+            jql = (body or {}).get("jql") or query.get("jql", [""])[0]
+
+            # the delta sync queries are by date, nothing is updated
+            issues = [issue for issue in
+                      map(org.ticket, TICKET_ID_PATTERN.findall(jql))
+                      if issue is not None]
+
+            return self.send_json("jira", 200, {
+                "startAt": 0, "maxResults": len(issues),
+                "total": len(issues), "issues": issues})
+
+        self.send_json("jira", 404, {"errorMessages": ["Not Found"]})
+
+    def is_rate_limited(self):
+        if not self.state.rate_limit_every:
+            return False
+
+        with self.state.lock:
+            self.state.miro_requests += 1
+            return self.state.miro_requests % \
+                self.state.rate_limit_every == 0
+
+    def create_item(self, store, item, item_type):
+        with self.state.lock:
+            item_id = str(next(self.state.ids))
+
+        item = dict(item, id=item_id, type=item_type)
+        store[item_id] = item
+
+        return item
+
+    def handle_miro(self, path, query):
+        state = self.state
+
+        if self.is_rate_limited():
+            return self.send_json("miro", 429, {"message": "Too many"},
+                                  {"Retry-After": "1"})
+
+        match = re.match(r"/miro/boards/([^/]+)/"
+                         r"(shapes|connectors|items|frames)(?:/([^/]+))?$",
+                         path)
+        if match is None:
+            return self.send_json("miro", 404, {"message": "Not Found"})
+
+        board_id, kind, item_id = match.groups()
+
+        with state.lock:
+            items, connectors = state.boards[board_id]
+
+        if self.command == "POST" and kind == "items" and item_id == "bulk":
+            return self.send_json("miro", 201, {
+                "type": "bulk-list",
+                "data": [self.create_item(items, item, item["type"])
+                         for item in self.read_json()]})
+
+        store = connectors if kind == "connectors" else items
+
+        if self.command == "POST" and item_id is None:
+            return self.send_json("miro", 201, self.create_item(
+                    store, self.read_json(), kind[:-1]))
+
+        if self.command == "GET" and item_id is None:
+            return self.send_json("miro", 200, self.list_items(store, query))
+
+        if item_id not in store:
+            return self.send_json("miro", 404, {"message": "Not Found"})
+
+        if self.command == "PATCH":
+            store[item_id].update(self.read_json())
+            return self.send_json("miro", 200, store[item_id])
+
+        if self.command == "DELETE":
+            del store[item_id]
+
+            for connector_id, connector in list(connectors.items()):
+                if item_id in (connector["startItem"]["id"],
+                               connector["endItem"]["id"]):
+                    connectors.pop(connector_id, None)
+
+            return self.send_json("miro", 204)
+
+        self.send_json("miro", 405, {"message": "Not Allowed"})
+
+    @staticmethod
+    def list_items(store, query):
+        items = list(store.values())
+
+        if "type" in query:
+            items = [item for item in items
+                     if item.get("type") == query["type"][0]]
+
+        if "parent_item_id" in query:
+            items = [item for item in items
+                     if (item.get("parent") or {}).get("id") ==
+                     query["parent_item_id"][0]]
+
+        limit = int(query.get("limit", ["50"])[0])
+        start = int(query.get("cursor", ["0"])[0] or 0)
+
+        page = {"data": items[start:start + limit], "total": len(items)}
+
+        if start + limit < len(items):
+            page["cursor"] = str(start + limit)
+
+        return page
+
+
+def serve(port, org, latency_seconds, rate_limit_every, started):
+    MockHandler.state = MockState(org, latency_seconds, rate_limit_every)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+
+    started.set()
+    server.serve_forever()
+
+
+class MockServices:
+    """
+    Runs the mocked services in a separate process.
+    """
+
+    def __init__(self, org, port=8765, latency_seconds=0.0,
+                 rate_limit_every=0):
+        self.url = f"http://127.0.0.1:{port}"
+
+        self._started = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+                target=serve,
+                args=(port, org, latency_seconds, rate_limit_every,
+                      self._started),
+                daemon=True)
+
+    def start(self):
+        self._process.start()
+        self._started.wait(10)
+
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def stats(self):
+        """
+        :return: requests count per "service method status"
+        """
+        with urllib.request.urlopen(self.url + "/_stats") as response:
+            return json.loads(response.read())
+
+    def reset_stats(self):
+        request = urllib.request.Request(self.url + "/_reset", method="POST")
+        urllib.request.urlopen(request).close()
@@ -0,0 +1,113 @@
+"""
+Cold start benchmark: the import of the board module and its first Jira
+search, each run in a fresh interpreter against the local stand-ins.
+
+Reports the median milliseconds of every step per Jira backend, and the
+import time when Jira is unreachable.
+
+Usage:
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mock_services import MockServices, SyntheticOrg  # noqa
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# run in the child interpreter, the import of the standard library modules
+# is not measured
+STARTUP_SCRIPT = """
+import json
+import logging
+import time
+
+started_at = time.perf_counter()
+import main
+imported_at = time.perf_counter()
+
+from jira_utils import search_jira_tickets
+search_jira_tickets(["ABC-1", "ABC-2", "ABC-3"])
+searched_at = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported_at - started_at) * 1000,
+    "first_search_ms": (searched_at - imported_at) * 1000,
+}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5,
+                        help='fresh interpreters per backend')
+    parser.add_argument('--port', type=int, default=8766)
+
+    return parser.parse_args()
+
+
+def run_startup(env):
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT],
+                            cwd=SRC_DIR, env=env, capture_output=True,
+                            text=True, timeout=300, check=True)
+
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def report(name, runs):
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    search_ms = statistics.median(run["first_search_ms"] for run in runs)
+
+    print(f"{name}: import {import_ms:.1f}ms, "
+          f"first search {search_ms:.1f}ms, "
+          f"total {import_ms + search_ms:.1f}ms")
+
+
+def main():
+    args = parse_args()
+
+    services = MockServices(SyntheticOrg(), port=args.port).start()
+    state_dir = tempfile.mkdtemp(prefix='startup-benchmark-')
+
+    env = dict(os.environ,
+               REPOS="repo-0000",
+               GITHUB_OWNER="org",
+               GITHUB_API_TOKEN="token",
+               GITHUB_API_URL=services.url + "/github",
+               JIRA_API_URL=services.url + "/jira",
+               JIRA_USERNAME="user",
+               JIRA_API_TOKEN="token",
+               JIRA_BROWSE_URL=services.url + "/jira/browse",
+               MIRO_API_URL=services.url + "/miro",
+               MIRO_API_TOKEN="token",
+               MIRO_BOARD_ID="board",
+               BOARD_STATE_FILE=os.path.join(state_dir, "board-state.json"))
+
+    for name in ("JIRA_CACHE_FILE", "GITHUB_CACHE_DIR", "COMPARE_CACHE_DIR",
+                 "BOARDS_CONFIG_FILE"):
+        env.pop(name, None)
+
+    try:
+        for backend in ("library", "rest"):
+            report(f"jira backend {backend}",
+                   [run_startup(dict(env, JIRA_BACKEND=backend))
+                    for _ in range(args.runs)])
+    finally:
+        services.stop()
+
+    # nothing listens on the port, the import must not wait for Jira
+    unreachable = run_startup(dict(env, JIRA_API_URL="http://127.0.0.1:9/jira",
+                                   JIRA_BACKEND="rest",
+                                   MAX_REQUEST_RETRIES="0"))
+    print(f"unreachable jira: import {unreachable['import_ms']:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+
+from config import GITHUB_CONCURRENCY, JIRA_CONCURRENCY, MIRO_CONCURRENCY, \
+    GIT_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+GITHUB_SERVICE = 'github'
+JIRA_SERVICE = 'jira'
+MIRO_SERVICE = 'miro'
+GIT_SERVICE = 'git'
+
+
+class AsyncEngine:
+    """
+    Single event loop shared by the whole process, all the requests of a
+    cycle are scheduled on it.
+
+    Every service has its own semaphore, so the number of in-flight
+    requests per service is bounded no matter how many stages run at the
+    same time. The blocking calls are executed on one bounded worker pool
+    sized to the sum of the service limits, so the pooled HTTP sessions,
+    caches and retries keep working unchanged.
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+
+        self._loop = None
+        self._semaphores = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=sum(self.limits.values()),
+                    thread_name_prefix='engine')
+
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+
+            threading.Thread(target=self._loop.run_forever,
+                             name='engine-loop', daemon=True).start()
+
+            self._semaphores = {
+                service: asyncio.Semaphore(limit)
+                for service, limit in self.limits.items()
+            }
+
+    async def call(self, service, func, *args):
+        async with self._semaphores[service]:
+            return await self._loop.run_in_executor(
+                    None, functools.partial(func, *args))
+
+    async def gather(self, service, func, *iterables):
+        return await asyncio.gather(
+                *(self.call(service, func, *args)
+                  for args in zip(*iterables)))
+
+    def run(self, coroutine):
+        """
+        Run a coroutine on the engine loop and wait for its result.
+        """
+        self._ensure_started()
+
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+        return future.result()
+
+    def map(self, service, func, *iterables):
+        """
+        Like the builtin map, but the calls are executed concurrently
+        within the service limit. The results keep the order of the
+        arguments.
+        """
+        self._ensure_started()
+
+        return self.run(self.gather(service, func, *iterables))
+
+
+engine = AsyncEngine({
+    GITHUB_SERVICE: GITHUB_CONCURRENCY,
+    JIRA_SERVICE: JIRA_CONCURRENCY,
+    MIRO_SERVICE: MIRO_CONCURRENCY,
+    GIT_SERVICE: GIT_CONCURRENCY,
+})
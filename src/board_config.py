@@ -0,0 +1,169 @@
+import json
+import os
+
+from config import (
+    REPOS,
+    BRANCHES,
+    MIRO_BOARD_ID,
+    SHAPE_COLOR_NO_TICKETS,
+    SHAPE_COLOR_TICKETS,
+    BOARD_STATE_FILE,
+    SHARD_REGION_WIDTH,
+)
+
+
+class BoardRegion:
+    """
+    Vertical band of the board reserved for one shard, a shape belongs to
+    the region when its center is inside.
+    """
+
+    def __init__(self, left, width):
+        self.left = left
+        self.width = width
+
+    def contains(self, x):
+        return self.left <= x < self.left + self.width
+
+
+class BoardConfig:
+    """
+    One Miro board with its own repos, branches and colors.
+
+    A sharded board renders only its part of the repos into its region of
+    the Miro board, the items outside the region are left untouched.
+    """
+
+    def __init__(self, board_id, repos, branches,
+                 shape_color_no_tickets=SHAPE_COLOR_NO_TICKETS,
+                 shape_color_tickets=SHAPE_COLOR_TICKETS,
+                 state_file=BOARD_STATE_FILE,
+                 shard_index=0, shard_count=1, region=None):
+        if not board_id:
+            raise ValueError("Missing Miro board id")
+
+        if len(branches) < 2:
+            raise ValueError(f"At least two branches are needed "
+                             f"for board {board_id}")
+
+        self.board_id = board_id
+        self.repos = repos
+        self.branches = branches
+        self.shape_color_no_tickets = shape_color_no_tickets
+        self.shape_color_tickets = shape_color_tickets
+        self.state_file = state_file
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.region = region
+
+    def repo_branch_pairs(self, repos=None):
+        """
+        :param repos: only these repos of the board, all when None
+        :return: list of repo, base branch, compare branch
+        """
+        return [(repo, self.branches[i], self.branches[i + 1])
+                for repo in self.repos
+                if repos is None or repo in repos
+                for i in range(len(self.branches) - 1)]
+
+
+def default_board_config():
+    """
+    The single board configured with the environment.
+    """
+    if not REPOS:
+        raise ValueError("Missing REPOS")
+
+    return BoardConfig(MIRO_BOARD_ID, REPOS, BRANCHES)
+
+
+def shard_board_config(board, shard_index, shard_count):
+    """
+    Keep only the repos of the shard, the sorted repos are dealt round
+    robin so every pod computes the same split and the shards differ by
+    one repo at most. The shards are placed side by side, each one in a
+    SHARD_REGION_WIDTH wide region.
+
+    :param board: BoardConfig
+    :param shard_index: from 0 to shard_count - 1
+    :param shard_count:
+    :return: BoardConfig of the shard
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard index {shard_index} "
+                         f"of {shard_count} shards")
+
+    shard_repos = set(sorted(board.repos)[shard_index::shard_count])
+
+    # keep the order of the rows
+    repos = [repo for repo in board.repos if repo in shard_repos]
+
+    root, ext = os.path.splitext(board.state_file)
+
+    return BoardConfig(
+            board.board_id, repos, board.branches,
+            shape_color_no_tickets=board.shape_color_no_tickets,
+            shape_color_tickets=board.shape_color_tickets,
+            state_file=f"{root}-shard-{shard_index}{ext}",
+            shard_index=shard_index,
+            shard_count=shard_count,
+            region=BoardRegion(shard_index * SHARD_REGION_WIDTH,
+                               SHARD_REGION_WIDTH))
+
+
+def board_state_file(board_id):
+    """
+    Every board of the config file has its own state, next to the
+    BOARD_STATE_FILE.
+    """
+    root, ext = os.path.splitext(BOARD_STATE_FILE)
+
+    return f"{root}-{board_id}{ext or '.json'}"
+
+
+def load_boards_config(config_file):
+    """
+    Read the boards from a JSON file, e.g.
+
+    {"boards": [{"board_id": "...", "repos": ["repo1", "repo2"],
+                 "branches": ["master", "qa", "production"],
+                 "shape_color_no_tickets": "#AFE1AF",
+                 "shape_color_tickets": "#FFCCCB"}]}
+
+    Only board_id and repos are required, the rest defaults to the
+    environment settings.
+
+    :param config_file:
+    :return: list of BoardConfig
+    """
+    with open(config_file, 'r') as f:
+        data = json.load(f)
+
+    boards = []
+
+    for board in data.get("boards", []):
+        board_id = board.get("board_id")
+
+        if not board.get("repos"):
+            raise ValueError(f"Missing repos of board {board_id}")
+
+        boards.append(BoardConfig(
+                board_id,
+                board.get("repos") or [],
+                board.get("branches") or BRANCHES,
+                shape_color_no_tickets=board.get(
+                        "shape_color_no_tickets", SHAPE_COLOR_NO_TICKETS),
+                shape_color_tickets=board.get(
+                        "shape_color_tickets", SHAPE_COLOR_TICKETS),
+                state_file=board.get("state_file") or
+                board_state_file(board_id)))
+
+    board_ids = [board.board_id for board in boards]
+
+    if len(set(board_ids)) != len(board_ids):
+        raise ValueError(f"Duplicated board ids in {config_file}")
+
+    if not boards:
+        raise ValueError(f"No boards in {config_file}")
+
+    return boards
@@ -0,0 +1,212 @@
+import logging
+
+from async_engine import engine, MIRO_SERVICE
+from board_reconciler import DesiredBoard, load_board_state, \
+    save_board_state, shape_content_hash
+from metrics import phase
+from miro_utils import (
+    miro_create_frame,
+    miro_move_frame,
+    miro_delete_frame,
+    miro_get_frame_children,
+    miro_get_all_frames,
+    miro_get_all_shapes,
+    miro_post_shapes,
+    miro_create_connectors,
+    miro_delete_shapes,
+)
+
+logger = logging.getLogger(__name__)
+
+FRAME_TITLE = 'Git Apollo Miraisor'
+
+FRAME_MARGIN = 100
+
+FRAME_GAP = 1000
+
+
+def board_bounds(desired_board):
+    """
+    :param desired_board:
+    :return: min x, min y, max x, max y of all the shapes
+    """
+    min_x, min_y = float('inf'), float('inf')
+    max_x, max_y = float('-inf'), float('-inf')
+
+    for shape_payload in desired_board.shapes.values():
+        x = shape_payload['position']['x']
+        y = shape_payload['position']['y']
+        half_width = shape_payload['geometry']['width'] / 2
+        half_height = shape_payload['geometry']['height'] / 2
+
+        min_x = min(min_x, x - half_width)
+        min_y = min(min_y, y - half_height)
+        max_x = max(max_x, x + half_width)
+        max_y = max(max_y, y + half_height)
+
+    return min_x, min_y, max_x, max_y
+
+
+def frame_title(board):
+    if board.shard_count > 1:
+        return f"{FRAME_TITLE} {board.shard_index + 1}/{board.shard_count}"
+
+    return FRAME_TITLE
+
+
+def frame_child_payload(shape_payload, frame_id, left, top):
+    """
+    The position of a frame child is relative to the frame top left corner.
+    """
+    position = dict(shape_payload['position'],
+                    x=shape_payload['position']['x'] - left,
+                    y=shape_payload['position']['y'] - top)
+
+    return dict(shape_payload, position=position, parent={"id": frame_id})
+
+
+def desired_board_hash(desired_board):
+    return shape_content_hash({"shapes": desired_board.shapes,
+                               "connectors": desired_board.connectors})
+
+
+def delete_frame_with_children(board_id, frame_id):
+    """
+    One request per child and one for the frame.
+    """
+    children_ids = [child['id'] for child in
+                    miro_get_frame_children(board_id, frame_id)]
+
+    # the connectors are removed together with the shapes
+    miro_delete_shapes(board_id, children_ids)
+
+    miro_delete_frame(board_id, frame_id)
+
+
+def delete_reconciled_shapes(board_id, state):
+    """
+    Remove the shapes left on the board by the reconcile render mode.
+    """
+    if not state["shapes"]:
+        return
+
+    board_shape_ids = set(shape['id'] for shape in
+                          miro_get_all_shapes(board_id))
+
+    miro_delete_shapes(board_id,
+                       [shape["id"] for shape in state["shapes"].values()
+                        if shape["id"] in board_shape_ids])
+
+
+def is_owned_frame(board, frame, state_frame_ids):
+    """
+    The frames of the board state are owned, a sharded board also owns the
+    frames drawn by this tool in its region, e.g. left by a run that lost
+    its state.
+    """
+    if frame['id'] in state_frame_ids:
+        return True
+
+    if board.region is None or frame.get('parent'):
+        return False
+
+    title = (frame.get('data') or {}).get('title') or ''
+
+    return title.startswith(FRAME_TITLE) and \
+        board.region.contains((frame.get('position') or {}).get('x', 0))
+
+
+def swap_board_frame(board, desired_board):
+    """
+    Render the desired board into a new frame placed above the visible
+    one, then swap the frames.
+
+    The viewers keep seeing the previous board while the new one is drawn.
+    The swap itself is one move per frame, the children move with their
+    frame. Only the frames recorded in the board state, or in the region
+    of a sharded board, are touched, a frame left behind by a failed cycle
+    is removed on the next one. The frames move only vertically, so they
+    never enter the region of another shard.
+
+    Every swap costs the requests drawing the new frame and one request per
+    shape of the previous one, so an unchanged board is not swapped: its
+    frame is kept as it is.
+    """
+    assert isinstance(desired_board, DesiredBoard)
+
+    board_id = board.board_id
+
+    state = load_board_state(board)
+
+    state_frame_ids = set(state.get("frame_ids", []))
+
+    owned_frame_ids = [frame['id'] for frame in miro_get_all_frames(board_id)
+                       if is_owned_frame(board, frame, state_frame_ids)]
+
+    board_hash = desired_board_hash(desired_board)
+
+    if state.get("board_hash") == board_hash and not state["shapes"] and \
+            owned_frame_ids == state.get("frame_ids"):
+        logger.info(f"Board {board_id} unchanged, keep frame "
+                    f"{owned_frame_ids[0]}")
+        return
+
+    min_x, min_y, max_x, max_y = board_bounds(desired_board)
+
+    left, top = min_x - FRAME_MARGIN, min_y - FRAME_MARGIN
+    width = max_x - min_x + 2 * FRAME_MARGIN
+    height = max_y - min_y + 2 * FRAME_MARGIN
+
+    home_x, home_y = left + width / 2, top + height / 2
+
+    frame = miro_create_frame(board_id, home_x, home_y - height - FRAME_GAP,
+                              width, height, frame_title(board))
+    frame_id = frame['id']
+
+    save_board_state(board, {"board_id": board_id,
+                             "shapes": state["shapes"],
+                             "connectors": state["connectors"],
+                             "frame_ids": owned_frame_ids + [frame_id]})
+
+    keys = list(desired_board.shapes)
+
+    with phase('shapes'):
+        shapes = miro_post_shapes(
+                board_id,
+                [frame_child_payload(desired_board.shapes[key], frame_id,
+                                     left, top)
+                 for key in keys])
+
+    key_to_shape_id = {key: shape['id'] for key, shape in zip(keys, shapes)
+                       if shape is not None}
+
+    with phase('connectors'):
+        miro_create_connectors(
+                board_id,
+                [(key_to_shape_id[start_key], key_to_shape_id[end_key])
+                 for start_key, end_key in desired_board.connectors
+                 if start_key in key_to_shape_id and
+                 end_key in key_to_shape_id])
+
+    # move the previous frames away first, the boards never overlap
+    engine.map(MIRO_SERVICE, miro_move_frame,
+               [board_id] * len(owned_frame_ids), owned_frame_ids,
+               [home_x] * len(owned_frame_ids),
+               [home_y + height + FRAME_GAP] * len(owned_frame_ids))
+
+    miro_move_frame(board_id, frame_id, home_x, home_y)
+
+    logger.info(f"Swapped frame {frame_id} in, "
+                f"delete previous frames: {len(owned_frame_ids)}")
+
+    with phase('cleanup'):
+        for owned_frame_id in owned_frame_ids:
+            delete_frame_with_children(board_id, owned_frame_id)
+
+        delete_reconciled_shapes(board_id, state)
+
+    save_board_state(board, {"board_id": board_id,
+                             "shapes": {},
+                             "connectors": {},
+                             "frame_ids": [frame_id],
+                             "board_hash": board_hash})
@@ -0,0 +1,71 @@
+from board_reconciler import DesiredBoard
+from config import REPO_PADDING, SHAPES_X_PADDING
+
+# space between the left edge of a shard region and its shapes
+REGION_MARGIN = 500
+
+
+class RepoRow:
+    """
+    Content of one repo row: the repo, its pull requests and the branch
+    pairs shapes, from left to right, each connected to the next one.
+    """
+
+    def __init__(self, repo, color, top_offset):
+        self.repo = repo
+        self.color = color
+        self.top_offset = top_offset
+        self.cells = []
+
+    def add_cell(self, key, text):
+        self.cells.append((key, text))
+
+
+def plan_board_layout(header_text, header_color, rows, x_origin=0):
+    """
+    Compute the position and size of every shape before any network call.
+
+    The size of a shape only depends on its text, so the whole board can
+    be laid out locally and all the shapes created at the same time.
+
+    :param header_text:
+    :param header_color:
+    :param rows: list of RepoRow
+    :param x_origin: center of the header and of the repo shapes
+    :return: DesiredBoard
+    """
+    board = DesiredBoard()
+
+    y_offset = 0
+
+    board.add_shape("header", x_origin, y_offset, header_text,
+                    color=header_color)
+    y_offset += REPO_PADDING
+
+    for row in rows:
+        assert isinstance(row, RepoRow)
+
+        y_offset += row.top_offset
+
+        x_offset = x_origin
+        max_shape_height = 0
+        previous_key = None
+
+        for i, (key, text) in enumerate(row.cells):
+            shape_payload = board.add_shape(key, x_offset, y_offset, text,
+                                            color=row.color)
+
+            if previous_key is not None:
+                board.add_connector(previous_key, key)
+            previous_key = key
+
+            x_offset += shape_payload['geometry']['width'] + SHAPES_X_PADDING
+
+            # the repo shape is not counted in the row height
+            if i > 0:
+                max_shape_height = max(max_shape_height,
+                                       shape_payload['geometry']['height'])
+
+        y_offset += max_shape_height / 2 + REPO_PADDING
+
+    return board
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import logging
+import os
+
+from async_engine import engine, MIRO_SERVICE
+from metrics import phase
+from miro_utils import (
+    build_shape_payload,
+    miro_post_shapes,
+    miro_update_shape,
+    miro_create_connectors,
+    miro_delete_shapes,
+    miro_delete_connectors,
+    miro_get_all_shapes,
+    miro_get_all_connectors,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DesiredBoard:
+    """
+    In memory description of the board we want to see on Miro.
+
+    Each shape is registered under a stable key (e.g. repo + branch pair),
+    connectors reference shapes by these keys.
+    """
+
+    def __init__(self):
+        self.shapes = {}
+        self.connectors = []
+
+    def add_shape(self, key, x, y, text, color=None):
+        shape_payload = build_shape_payload(x, y, text, color=color)
+        self.shapes[key] = shape_payload
+        return shape_payload
+
+    def add_connector(self, start_key, end_key):
+        self.connectors.append((start_key, end_key))
+
+
+def shape_content_hash(shape_payload):
+    return hashlib.sha1(
+            json.dumps(shape_payload, sort_keys=True).encode()).hexdigest()
+
+
+def live_shape_hash(content, x, y, width, height, color):
+    # Miro may return the colors in another case than the one sent
+    return hashlib.sha1(json.dumps(
+            [content, round(x), round(y), round(width), round(height),
+             color.lower() if color else color]).encode()).hexdigest()
+
+
+def board_shape_live_hash(shape):
+    """
+    Hash of what a shape read from the board shows, the same as the one of
+    the payload it was created from.
+    """
+    position = shape.get('position') or {}
+    geometry = shape.get('geometry') or {}
+
+    return live_shape_hash((shape.get('data') or {}).get('content'),
+                           position.get('x', 0), position.get('y', 0),
+                           geometry.get('width', 0),
+                           geometry.get('height', 0),
+                           (shape.get('style') or {}).get('fillColor'))
+
+
+def shape_payload_live_hash(shape_payload):
+    return live_shape_hash(shape_payload['data']['content'],
+                           shape_payload['position']['x'],
+                           shape_payload['position']['y'],
+                           shape_payload['geometry']['width'],
+                           shape_payload['geometry']['height'],
+                           shape_payload['style'].get('fillColor'))
+
+
+def match_board_shapes(desired_board, board_shapes, owned_shape_ids,
+                       known_shapes):
+    """
+    Adopt the owned shapes of the board which are not in the state but
+    show exactly a desired shape, so a run without the state of the
+    previous one, e.g. in a new container, keeps the unchanged shapes
+    instead of recreating the whole board.
+
+    :param known_shapes: key to state shape, updated in place
+    """
+    known_shape_ids = set(shape["id"] for shape in known_shapes.values())
+
+    hash_to_shape_ids = {}
+    for shape in board_shapes:
+        if shape['id'] in owned_shape_ids and \
+                shape['id'] not in known_shape_ids:
+            hash_to_shape_ids.setdefault(board_shape_live_hash(shape),
+                                         []).append(shape['id'])
+
+    matched = 0
+
+    for key, shape_payload in desired_board.shapes.items():
+        if key in known_shapes:
+            continue
+
+        shape_ids = hash_to_shape_ids.get(
+                shape_payload_live_hash(shape_payload))
+
+        if shape_ids:
+            known_shapes[key] = {"id": shape_ids.pop(),
+                                 "hash": shape_content_hash(shape_payload)}
+            matched += 1
+
+    if matched:
+        logger.info(f"Shapes matched on the board without state: {matched}")
+
+
+def connector_key(start_key, end_key):
+    return f"{start_key} -> {end_key}"
+
+
+def load_board_state(board):
+    empty_state = {"board_id": board.board_id, "shapes": {},
+                   "connectors": {}}
+
+    if not os.path.isfile(board.state_file):
+        return empty_state
+
+    try:
+        with open(board.state_file, 'r') as f:
+            state = json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load board state {board.state_file}: {e}")
+        return empty_state
+
+    if state.get("board_id") != board.board_id:
+        logger.info(f"Board state {board.state_file} is for another board, "
+                    f"ignore it")
+        return empty_state
+
+    return state
+
+
+def save_board_state(board, state):
+    tmp_file = board.state_file + ".tmp"
+
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+
+    os.replace(tmp_file, board.state_file)
+
+
+def is_owned_shape(board, shape, state_shape_ids):
+    """
+    The shapes of the board state are owned, a sharded board also owns the
+    shapes in its region, e.g. left by a run that lost its state. The
+    frame children are owned by their frame.
+    """
+    if board.region is None or shape['id'] in state_shape_ids:
+        return True
+
+    if shape.get('parent'):
+        return False
+
+    return board.region.contains((shape.get('position') or {}).get('x', 0))
+
+
+def reconcile_board(board, desired_board):
+    """
+    Apply the desired board to Miro with the minimum of calls.
+
+    Shapes are matched with the ones from the previous cycle by key,
+    unchanged shapes (same content hash) are left untouched, changed ones
+    are patched in place, missing ones are created and everything else
+    on the board, or in the region of a sharded board, is deleted. The
+    missing shapes are created in bulk chunks, the changed ones patched
+    concurrently, the connectors are wired from the returned ids.
+
+    Without the state of the previous cycle the owned shapes showing
+    exactly a desired shape and the connectors between them are kept.
+    """
+    assert isinstance(desired_board, DesiredBoard)
+
+    state = load_board_state(board)
+
+    state_shape_ids = set(shape["id"] for shape in state["shapes"].values())
+
+    board_shapes = miro_get_all_shapes(board.board_id)
+
+    board_shape_ids = set(shape['id'] for shape in board_shapes)
+
+    owned_shape_ids = set(
+            shape['id'] for shape in board_shapes
+            if is_owned_shape(board, shape, state_shape_ids))
+
+    board_connectors = miro_get_all_connectors(board.board_id)
+
+    board_connector_ids = set(connector['id']
+                              for connector in board_connectors)
+
+    known_shapes = {key: shape for key, shape in state["shapes"].items()
+                    if shape["id"] in board_shape_ids}
+
+    if len(known_shapes) < len(desired_board.shapes):
+        match_board_shapes(desired_board, board_shapes, owned_shape_ids,
+                           known_shapes)
+
+    keep_shape_ids = set(known_shapes[key]["id"]
+                         for key in desired_board.shapes
+                         if key in known_shapes)
+
+    stale_shape_ids = owned_shape_ids - keep_shape_ids
+
+    if stale_shape_ids:
+        logger.info(f"Delete stale shapes: {len(stale_shape_ids)}")
+
+        with phase('cleanup'):
+            miro_delete_shapes(board.board_id, stale_shape_ids)
+
+    new_shapes_state = {}
+    unchanged = 0
+
+    created_keys, created_hashes, created_payloads = [], [], []
+    updated_keys, updated_hashes, updated_payloads = [], [], []
+    updated_shape_ids = []
+
+    for key, shape_payload in desired_board.shapes.items():
+        shape_hash = shape_content_hash(shape_payload)
+        known_shape = known_shapes.get(key)
+
+        if known_shape is None:
+            created_keys.append(key)
+            created_hashes.append(shape_hash)
+            created_payloads.append(shape_payload)
+        elif known_shape["hash"] != shape_hash:
+            updated_keys.append(key)
+            updated_hashes.append(shape_hash)
+            updated_payloads.append(shape_payload)
+            updated_shape_ids.append(known_shape["id"])
+        else:
+            new_shapes_state[key] = known_shape
+            unchanged += 1
+
+    with phase('shapes'):
+        created_shapes = miro_post_shapes(board.board_id, created_payloads)
+
+        updated_shapes = engine.map(MIRO_SERVICE, miro_update_shape,
+                                    [board.board_id] * len(updated_keys),
+                                    updated_shape_ids, updated_payloads)
+
+    created, updated = len(created_keys), len(updated_keys)
+
+    for key, shape_hash, shape in zip(created_keys + updated_keys,
+                                      created_hashes + updated_hashes,
+                                      created_shapes + updated_shapes):
+        if shape is None:
+            logger.warning(f"Failed to create or update shape: {key}")
+            continue
+
+        new_shapes_state[key] = {"id": shape["id"], "hash": shape_hash}
+
+    logger.info(f"Shapes created: {created}, updated: {updated}, "
+                f"unchanged: {unchanged}, deleted: {len(stale_shape_ids)}")
+
+    # the connectors between kept shapes which are not in the state
+    ends_to_board_connector = {
+        ((connector.get('startItem') or {}).get('id'),
+         (connector.get('endItem') or {}).get('id')): connector
+        for connector in board_connectors}
+
+    new_connectors_state = {}
+    connectors_to_create = []
+    connector_keys_to_create = []
+
+    for start_key, end_key in desired_board.connectors:
+        if start_key not in new_shapes_state or \
+                end_key not in new_shapes_state:
+            continue
+
+        key = connector_key(start_key, end_key)
+        start_id = new_shapes_state[start_key]["id"]
+        end_id = new_shapes_state[end_key]["id"]
+
+        known_connector = state["connectors"].get(key)
+
+        if known_connector is not None and \
+                known_connector["id"] in board_connector_ids and \
+                known_connector["start_id"] == start_id and \
+                known_connector["end_id"] == end_id:
+            new_connectors_state[key] = known_connector
+            continue
+
+        board_connector = ends_to_board_connector.get((start_id, end_id))
+
+        if board_connector is not None:
+            new_connectors_state[key] = {"id": board_connector["id"],
+                                         "start_id": start_id,
+                                         "end_id": end_id}
+            continue
+
+        connectors_to_create.append((start_id, end_id))
+        connector_keys_to_create.append(key)
+
+    kept_connector_ids = set(
+            connector["id"] for connector in new_connectors_state.values())
+
+    stale_connector_ids = [
+        connector["id"] for connector in state["connectors"].values()
+        if connector["id"] in board_connector_ids
+        and connector["id"] not in kept_connector_ids
+        and connector["start_id"] not in stale_shape_ids
+        and connector["end_id"] not in stale_shape_ids]
+
+    with phase('connectors'):
+        if stale_connector_ids:
+            miro_delete_connectors(board.board_id, stale_connector_ids)
+
+        created_connectors = miro_create_connectors(board.board_id,
+                                                    connectors_to_create)
+
+    for key, (start_id, end_id), connector in zip(connector_keys_to_create,
+                                                  connectors_to_create,
+                                                  created_connectors):
+        if connector is None:
+            continue
+
+        new_connectors_state[key] = {"id": connector["id"],
+                                     "start_id": start_id,
+                                     "end_id": end_id}
+
+    logger.info(f"Connectors created: {len(connectors_to_create)}, "
+                f"deleted: {len(stale_connector_ids)}, "
+                f"unchanged: {len(kept_connector_ids)}")
+
+    save_board_state(board, {"board_id": board.board_id,
+                             "shapes": new_shapes_state,
+                             "connectors": new_connectors_state})
@@ -0,0 +1,95 @@
+import collections
+
+from config import SHAPE_MAX_LINES
+from git_utils import parse_more_commits_marker
+
+# largest groups named in the summary line, the others are counted together
+SUMMARY_MAX_GROUPS = 5
+
+
+def ticket_project(ticket_id):
+    return ticket_id.split('-')[0]
+
+
+def summary_line(hidden_count, group_counts):
+    """
+    :param hidden_count: items not shown
+    :param group_counts: Counter of the hidden items per group
+    :return: e.g. "+120 more: ABC 80, DEF 30, others 10"
+    """
+    groups = group_counts.most_common(SUMMARY_MAX_GROUPS)
+
+    texts = [f"{group} {count}" for group, count in groups]
+
+    others = sum(group_counts.values()) - sum(count for _, count in groups)
+    if others:
+        texts.append(f"others {others}")
+
+    return f"+{hidden_count} more: {', '.join(texts)}"
+
+
+def summarize_branch_pair(ticket_ids, lines, authors,
+                          max_lines=SHAPE_MAX_LINES):
+    """
+    Keep at most max_lines lines in the shape of a branch pair, the last one
+    sums up the hidden tickets per Jira project and the hidden commits per
+    author, e.g. "+120 more: ABC 80, @dev 30, commits 10", so the tickets
+    to resolve and the shape text stay bounded however far the branches
+    diverged. The hidden commits of unknown authors, e.g. the ones past
+    MAX_COMMITS_PER_COMPARE, are counted as commits.
+
+    :param ticket_ids: sorted ticket ids
+    :param lines: display lines of the commits without ticket ids
+    :param authors: of the lines, None when not known
+    :param max_lines: not positive for no limit
+    :return: shown ticket ids and lines, the summary line last
+    """
+    if max_lines <= 0 or len(ticket_ids) + len(lines) <= max_lines:
+        return ticket_ids, lines
+
+    shown_count = max_lines - 1
+
+    shown_ticket_ids = ticket_ids[:shown_count]
+    shown_lines = lines[:shown_count - len(shown_ticket_ids)]
+
+    group_counts = collections.Counter(
+            ticket_project(ticket_id)
+            for ticket_id in ticket_ids[len(shown_ticket_ids):])
+
+    hidden_lines = lines[len(shown_lines):]
+    hidden_authors = authors[len(shown_lines):]
+
+    hidden_commits = 0
+
+    for line, author in zip(hidden_lines, hidden_authors):
+        # the commits past MAX_COMMITS_PER_COMPARE are hidden too
+        count = parse_more_commits_marker(line) if author is None else None
+
+        group_counts[f"@{author}" if author else 'commits'] += count or 1
+        hidden_commits += count or 1
+
+    hidden_count = len(ticket_ids) - len(shown_ticket_ids) + hidden_commits
+
+    return shown_ticket_ids, \
+        shown_lines + [summary_line(hidden_count, group_counts)]
+
+
+def summarize_pr_infos(pr_infos, max_lines=SHAPE_MAX_LINES):
+    """
+    Same for the pull requests shape, the hidden pull requests are summed
+    up per author.
+
+    :param pr_infos: list of PullRequestInfo
+    :param max_lines: not positive for no limit
+    :return: shown pull requests and the summary line or None
+    """
+    if max_lines <= 0 or len(pr_infos) <= max_lines:
+        return pr_infos, None
+
+    shown_pr_infos = pr_infos[:max_lines - 1]
+    hidden_pr_infos = pr_infos[max_lines - 1:]
+
+    group_counts = collections.Counter(pr_info.author
+                                       for pr_info in hidden_pr_infos)
+
+    return shown_pr_infos, summary_line(len(hidden_pr_infos), group_counts)
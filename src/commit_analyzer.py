@@ -0,0 +1,78 @@
+import re
+
+from config import TRUNCATE_LINE_LENGTH
+
+TICKET_ID_PATTERN = re.compile(r'[A-Z]+-\d+')
+
+IGNORED_TICKET_ID = 'LITE-000'
+
+MERGE_COMMIT_MARKER = 'pull request #'
+
+
+class CommitRecord:
+    """
+    Everything the board needs from one commit, extracted in a single pass
+    over the message.
+    """
+    __slots__ = ('ticket_ids', 'is_merge', 'line', 'author')
+
+    def __init__(self, ticket_ids, is_merge, line, author=None):
+        self.ticket_ids = ticket_ids
+        self.is_merge = is_merge
+        self.line = line
+        self.author = author
+
+
+def truncate_line(line):
+    return line[:TRUNCATE_LINE_LENGTH] + (line[TRUNCATE_LINE_LENGTH:] and '...')
+
+
+def extract_ticket_ids(text):
+    """
+    :param text: commit message or pull request title
+    :return: sorted unique ticket ids
+    """
+    return sorted(set(
+            ticket_id for ticket_id in TICKET_ID_PATTERN.findall(text)
+            if IGNORED_TICKET_ID not in ticket_id))
+
+
+def analyze_commit_message(commit_message, author=None):
+    return CommitRecord(extract_ticket_ids(commit_message),
+                        MERGE_COMMIT_MARKER in commit_message,
+                        truncate_line(commit_message),
+                        author)
+
+
+def analyze_commit_messages(commits):
+    """
+    Consume the commits one by one, so they can be streamed from the paged
+    compare without keeping all of them in memory.
+
+    :param commits: iterable of commit message and author, None when the
+                    author is not known
+    :return: sorted ticket ids, the display lines of the commits without
+             any ticket id, merge commits excluded, and the authors of
+             these lines
+    """
+    ticket_ids = set()
+    lines = []
+    authors = []
+    any_merge_without_ticket_ids = False
+
+    for commit_message, author in commits:
+        record = analyze_commit_message(commit_message, author)
+
+        if record.ticket_ids:
+            ticket_ids.update(record.ticket_ids)
+        elif record.is_merge:
+            any_merge_without_ticket_ids = True
+        else:
+            lines.append(record.line)
+            authors.append(record.author)
+
+    if not lines and any_merge_without_ticket_ids:
+        lines.append('...')
+        authors.append(None)
+
+    return sorted(ticket_ids), lines, authors
@@ -0,0 +1,133 @@
+import collections
+import hashlib
+import threading
+
+from config import MAX_COMMITS_PER_COMPARE, TRUNCATE_LINE_LENGTH
+from disk_cache import DiskCache
+
+# the analyzed result also depends on these settings
+CACHE_FORMAT = f"v2 {MAX_COMMITS_PER_COMPARE} {TRUNCATE_LINE_LENGTH}"
+
+
+def entry_size(value):
+    ticket_ids, lines, authors = value
+
+    return 64 + sum(len(text) + 56 for text in ticket_ids) + \
+        sum(len(text) + 56 for text in lines) + \
+        sum(len(text or '') + 8 for text in authors)
+
+
+class CompareCache:
+    """
+    Content addressed cache of the analyzed branch pairs.
+
+    The commits between two commit SHAs never change, so the ticket ids,
+    the display lines and their authors of a branch pair are cached by the head SHAs of
+    both branches: an unchanged pair needs no compare call and no parsing.
+
+    Entries are kept in memory (LRU bounded by their approximate size)
+    and, when cache_dir is set, also on disk where the least recently used
+    files are removed above max_dir_bytes.
+    """
+
+    def __init__(self, max_bytes, cache_dir=None, max_dir_bytes=0):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_dir_bytes = max_dir_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._disk = DiskCache(cache_dir, max_bytes=max_dir_bytes,
+                               name='compares') if cache_dir else None
+
+    @staticmethod
+    def cache_key(repo, base_sha, compare_sha):
+        return hashlib.sha1(
+                f"{CACHE_FORMAT} {repo} {base_sha} {compare_sha}".encode()
+        ).hexdigest()
+
+    def get(self, cache_key):
+        """
+        :param cache_key:
+        :return: sorted ticket ids, display lines and their authors or
+                 None
+        """
+        with self._lock:
+            value = self._entries.get(cache_key)
+
+            if value is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return value
+
+        value = self._load(cache_key)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        self._put_in_memory(cache_key, value)
+
+        return value
+
+    def put(self, cache_key, ticket_ids, lines, authors):
+        value = (list(ticket_ids), list(lines), list(authors))
+
+        self._put_in_memory(cache_key, value)
+        self._save(cache_key, value)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+        if self._disk is not None:
+            stats["disk"] = self._disk.stats()
+
+        return stats
+
+    def _put_in_memory(self, cache_key, value):
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._size -= entry_size(previous)
+
+            self._entries[cache_key] = value
+            self._size += entry_size(value)
+
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= entry_size(evicted)
+
+    def _load(self, cache_key):
+        if self._disk is None:
+            return None
+
+        data = self._disk.load(cache_key)
+
+        if data is None:
+            return None
+
+        return data["ticket_ids"], data["lines"], data["authors"]
+
+    def _save(self, cache_key, value):
+        if self._disk is None:
+            return
+
+        self._disk.save(cache_key, {"ticket_ids": value[0],
+                                    "lines": value[1],
+                                    "authors": value[2]})
@@ -8,19 +8,24 @@ def get_default_if_empty(env_value, default):
         return env_value
 
 
-GITHUB_API_URL = "https://api.github.com"
+GITHUB_API_URL = get_default_if_empty(os.environ.get("GITHUB_API_URL"),
+                                      "https://api.github.com")
 GITHUB_API_TOKEN = os.environ.get("GITHUB_API_TOKEN")
 GITHUB_OWNER = os.environ.get("GITHUB_OWNER")
 
 JIRA_API_URL = os.environ.get("JIRA_API_URL")
 JIRA_USERNAME = os.environ.get("JIRA_USERNAME")
 JIRA_API_TOKEN = os.environ.get("JIRA_API_TOKEN")
+JIRA_BACKEND = get_default_if_empty(os.environ.get("JIRA_BACKEND"), "library")
 
-MIRO_API_URL = "https://api.miro.com/v2"
+MIRO_API_URL = get_default_if_empty(os.environ.get("MIRO_API_URL"),
+                                    "https://api.miro.com/v2")
 MIRO_API_TOKEN = os.environ.get("MIRO_API_TOKEN")
 MIRO_BOARD_ID = os.environ.get("MIRO_BOARD_ID")
 
-REPOS = os.environ.get("REPOS").split(",")
+REPOS = [repo for repo in
+         get_default_if_empty(os.environ.get("REPOS"), "").split(",")
+         if repo]
 BRANCHES = get_default_if_empty(os.environ.get("BRANCHES"),
                                 "master,qa,staging,production").split(",")
 
@@ -38,8 +43,118 @@ SHAPE_COLOR_TICKETS = get_default_if_empty(
 SHAPE_MAX_HEIGHT = int(
         get_default_if_empty(os.environ.get("SHAPE_MAX_HEIGHT"), 500))
 
+SHAPE_MAX_LINES = int(
+        get_default_if_empty(os.environ.get("SHAPE_MAX_LINES"), 20))
+
 TRUNCATE_LINE_LENGTH = int(
         get_default_if_empty(os.environ.get("TRUNCATE_LINE_LENGTH"), 65))
 
 MAX_REQUEST_RETRIES = int(
         get_default_if_empty(os.environ.get("MAX_REQUEST_RETRIES"), 7))
+
+BOARD_STATE_FILE = get_default_if_empty(os.environ.get("BOARD_STATE_FILE"),
+                                        "./board-state.json")
+
+# a Kubernetes indexed job sets JOB_COMPLETION_INDEX for every pod
+SHARD_INDEX = int(get_default_if_empty(
+        os.environ.get("SHARD_INDEX"),
+        get_default_if_empty(os.environ.get("JOB_COMPLETION_INDEX"), 0)))
+SHARD_COUNT = int(get_default_if_empty(os.environ.get("SHARD_COUNT"), 1))
+SHARD_REGION_WIDTH = int(
+        get_default_if_empty(os.environ.get("SHARD_REGION_WIDTH"), 10000))
+
+BOARDS_CONFIG_FILE = os.environ.get("BOARDS_CONFIG_FILE")
+BOARD_RENDER_WORKERS = int(
+        get_default_if_empty(os.environ.get("BOARD_RENDER_WORKERS"), 4))
+
+JIRA_CACHE_MAX_SIZE = int(
+        get_default_if_empty(os.environ.get("JIRA_CACHE_MAX_SIZE"), 10000))
+JIRA_CACHE_TTL_SECONDS = int(
+        get_default_if_empty(os.environ.get("JIRA_CACHE_TTL_SECONDS"), 86400))
+JIRA_CACHE_SYNC_SECONDS = int(
+        get_default_if_empty(os.environ.get("JIRA_CACHE_SYNC_SECONDS"), 60))
+JIRA_CACHE_FILE = os.environ.get("JIRA_CACHE_FILE")
+JIRA_SEARCH_CHUNK_SIZE = int(
+        get_default_if_empty(os.environ.get("JIRA_SEARCH_CHUNK_SIZE"), 100))
+
+HTTP_POOL_SIZE = int(
+        get_default_if_empty(os.environ.get("HTTP_POOL_SIZE"), 0))
+HTTP_TIMEOUT_SECONDS = int(
+        get_default_if_empty(os.environ.get("HTTP_TIMEOUT_SECONDS"), 30))
+
+GITHUB_CACHE_DIR = os.environ.get("GITHUB_CACHE_DIR")
+GITHUB_CACHE_MAX_ENTRIES = int(
+        get_default_if_empty(os.environ.get("GITHUB_CACHE_MAX_ENTRIES"), 5000))
+
+GIT_MIRROR_DIR = get_default_if_empty(
+        os.environ.get("GIT_MIRROR_DIR"), "./git-mirrors")
+GIT_MIRROR_URL = get_default_if_empty(
+        os.environ.get("GIT_MIRROR_URL"),
+        "https://github.com/{owner}/{repo}.git")
+GIT_TIMEOUT_SECONDS = int(
+        get_default_if_empty(os.environ.get("GIT_TIMEOUT_SECONDS"), 600))
+
+COMPARE_CACHE_MAX_MB = int(
+        get_default_if_empty(os.environ.get("COMPARE_CACHE_MAX_MB"), 64))
+COMPARE_CACHE_DIR = os.environ.get("COMPARE_CACHE_DIR")
+COMPARE_CACHE_DIR_MAX_MB = int(
+        get_default_if_empty(os.environ.get("COMPARE_CACHE_DIR_MAX_MB"), 512))
+
+GITHUB_BACKEND = get_default_if_empty(os.environ.get("GITHUB_BACKEND"), "rest")
+GITHUB_GRAPHQL_CONNECTIONS_PER_QUERY = int(
+        get_default_if_empty(
+                os.environ.get("GITHUB_GRAPHQL_CONNECTIONS_PER_QUERY"), 25))
+MAX_COMMITS_PER_COMPARE = int(
+        get_default_if_empty(os.environ.get("MAX_COMMITS_PER_COMPARE"), 1000))
+
+GITHUB_CONCURRENCY = int(
+        get_default_if_empty(os.environ.get("GITHUB_CONCURRENCY"), 16))
+JIRA_CONCURRENCY = int(
+        get_default_if_empty(os.environ.get("JIRA_CONCURRENCY"), 4))
+MIRO_CONCURRENCY = int(
+        get_default_if_empty(os.environ.get("MIRO_CONCURRENCY"), 8))
+GIT_CONCURRENCY = int(
+        get_default_if_empty(os.environ.get("GIT_CONCURRENCY"), 8))
+
+MIRO_RATE_LIMIT_CREDITS = int(
+        get_default_if_empty(os.environ.get("MIRO_RATE_LIMIT_CREDITS"), 100000))
+MIRO_BACKOFF_BASE_SECONDS = float(
+        get_default_if_empty(os.environ.get("MIRO_BACKOFF_BASE_SECONDS"), 1))
+MIRO_BACKOFF_MAX_SECONDS = float(
+        get_default_if_empty(os.environ.get("MIRO_BACKOFF_MAX_SECONDS"), 60))
+
+# Miro limits the bulk create to 20 items per call
+MIRO_BULK_CHUNK_SIZE = min(20, int(
+        get_default_if_empty(os.environ.get("MIRO_BULK_CHUNK_SIZE"), 20)))
+
+# reconcile - patch the changed shapes in place
+# frame_swap - draw the board in a new frame and swap it with the previous
+BOARD_RENDER_MODE = get_default_if_empty(
+        os.environ.get("BOARD_RENDER_MODE"), "reconcile")
+
+# miro - render the boards on Miro
+# offline - write the board plans to RENDER_OUTPUT_DIR, nothing is sent
+RENDER_BACKEND = get_default_if_empty(os.environ.get("RENDER_BACKEND"), "miro")
+RENDER_OUTPUT_DIR = get_default_if_empty(
+        os.environ.get("RENDER_OUTPUT_DIR"), "./board-plans")
+RENDER_OUTPUT_FORMATS = [
+    output_format.strip() for output_format in get_default_if_empty(
+            os.environ.get("RENDER_OUTPUT_FORMATS"), "json,svg").split(",")]
+
+# 0 disables the Prometheus metrics endpoint
+METRICS_PORT = int(get_default_if_empty(os.environ.get("METRICS_PORT"), 0))
+
+# 0 disables the webhook listener
+WEBHOOK_PORT = int(get_default_if_empty(os.environ.get("WEBHOOK_PORT"), 0))
+WEBHOOK_DEBOUNCE_SECONDS = float(
+        get_default_if_empty(os.environ.get("WEBHOOK_DEBOUNCE_SECONDS"), 5))
+WEBHOOK_MAX_DELAY_SECONDS = float(
+        get_default_if_empty(os.environ.get("WEBHOOK_MAX_DELAY_SECONDS"), 60))
+GITHUB_WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET")
+JIRA_WEBHOOK_SECRET = os.environ.get("JIRA_WEBHOOK_SECRET")
+
+# skip the repos whose branch heads and open pull requests did not move
+REPO_CHANGE_DETECTION = get_default_if_empty(
+        os.environ.get("REPO_CHANGE_DETECTION"), "false").lower() == "true"
+REPO_POLL_MAX_SECONDS = int(
+        get_default_if_empty(os.environ.get("REPO_POLL_MAX_SECONDS"), 900))
@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    JSON files of a cache, one per cache key, kept between process restarts.
+
+    The files are bounded by their count (max_files) and / or their total
+    size (max_bytes), not positive for no limit: above a limit the least
+    recently used files are removed down to 90% of it. Loading a file
+    marks it as used.
+    """
+
+    def __init__(self, cache_dir, max_files=0, max_bytes=0, name='entries'):
+        """
+        :param cache_dir:
+        :param max_files:
+        :param max_bytes:
+        :param name: of the cached values in the logs
+        """
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.name = name
+
+        self._file_count = None
+        self._size = None
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(self, cache_key):
+        """
+        :param cache_key:
+        :return: saved data or None
+        """
+        cache_file = self._cache_file(cache_key)
+
+        if not os.path.isfile(cache_file):
+            return None
+
+        try:
+            with open(cache_file, 'r') as f:
+                data = json.load(f)
+
+            os.utime(cache_file)
+        except Exception as e:
+            logger.warning(f"Failed to load cached {self.name} "
+                           f"{cache_file}: {e}")
+            return None
+
+        return data
+
+    def save(self, cache_key, data):
+        cache_file = self._cache_file(cache_key)
+        tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f)
+
+        file_size = os.path.getsize(tmp_file)
+
+        try:
+            previous_size = os.path.getsize(cache_file)
+        except FileNotFoundError:
+            previous_size = None
+
+        os.replace(tmp_file, cache_file)
+
+        with self._lock:
+            if self._file_count is None:
+                self._scan()
+            else:
+                self._file_count += previous_size is None
+                self._size += file_size - (previous_size or 0)
+
+            if self._is_over(self._file_count, self._size, 1):
+                self._evict_files()
+
+    def stats(self):
+        with self._lock:
+            if self._file_count is None:
+                self._scan()
+
+            return {"files": self._file_count, "bytes": self._size}
+
+    def _cache_file(self, cache_key):
+        return os.path.join(self.cache_dir, f"{cache_key}.json")
+
+    def _is_over(self, file_count, size, ratio):
+        return (0 < self.max_files * ratio < file_count) or \
+            (0 < self.max_bytes * ratio < size)
+
+    def _cache_files(self):
+        """
+        :return: list of (modification time, size, file) of the cache files
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+
+            cache_file = os.path.join(self.cache_dir, name)
+
+            try:
+                file_stat = os.stat(cache_file)
+            except FileNotFoundError:
+                continue
+
+            files.append((file_stat.st_mtime, file_stat.st_size, cache_file))
+
+        return files
+
+    def _scan(self):
+        files = self._cache_files()
+
+        self._file_count = len(files)
+        self._size = sum(file_size for _, file_size, _ in files)
+
+    def _evict_files(self):
+        """
+        Remove the least recently used files down to 90% of the limits.
+        """
+        files = sorted(self._cache_files())
+
+        file_count = len(files)
+        size = sum(file_size for _, file_size, _ in files)
+        evicted = 0
+
+        for _, file_size, cache_file in files:
+            if not self._is_over(file_count, size, 0.9):
+                break
+
+            try:
+                os.remove(cache_file)
+            except FileNotFoundError:
+                pass
+
+            file_count -= 1
+            size -= file_size
+            evicted += 1
+
+        self._file_count = file_count
+        self._size = size
+
+        logger.info(f"Evicted cached {self.name}: {evicted}, "
+                    f"remaining: {file_count}, bytes: {size}")
@@ -0,0 +1,377 @@
+import http
+import json
+import logging
+
+import requests
+
+from async_engine import engine, GITHUB_SERVICE
+from config import (
+    GITHUB_API_URL,
+    GITHUB_OWNER,
+    GITHUB_GRAPHQL_CONNECTIONS_PER_QUERY,
+    MAX_COMMITS_PER_COMPARE,
+)
+from git_utils import PullRequestInfo, github_session, more_commits_marker
+from http_utils import request_with_retry
+
+logger = logging.getLogger(__name__)
+
+graphql_url = f'{GITHUB_API_URL}/graphql'
+
+PAGE_SIZE = 100
+
+PAGE_INFO_FIELDS = 'pageInfo { hasNextPage endCursor }'
+
+COMMITS_FIELDS = 'nodes { message author { name user { login } } } ' + \
+                 PAGE_INFO_FIELDS
+
+PULL_REQUESTS_FIELDS = 'nodes { title url author { login } } ' + \
+                       PAGE_INFO_FIELDS
+
+EMPTY_CONNECTION = {'nodes': [],
+                    'pageInfo': {'hasNextPage': False, 'endCursor': None}}
+
+
+def quote(value):
+    return json.dumps(value)
+
+
+def page_args(cursor):
+    if cursor is None:
+        return f'first: {PAGE_SIZE}'
+
+    return f'first: {PAGE_SIZE}, after: {quote(cursor)}'
+
+
+def compare_query(alias, base_branch, compare_branch, cursor=None):
+    # GraphQL compares from the ref to the head ref, so the ref is the
+    # REST compare branch and the head ref is the REST base branch
+    qualified_name = quote("refs/heads/" + compare_branch)
+
+    return f'{alias}: ref(qualifiedName: {qualified_name}) {{ ' \
+           f'compare(headRef: {quote(base_branch)}) {{ aheadBy ' \
+           f'commits({page_args(cursor)}) {{ {COMMITS_FIELDS} }} }} }}'
+
+
+def pull_requests_query(alias, to_branch, cursor=None):
+    return f'{alias}: pullRequests(states: OPEN, ' \
+           f'baseRefName: {quote(to_branch)}, {page_args(cursor)}) ' \
+           f'{{ {PULL_REQUESTS_FIELDS} }}'
+
+
+def head_query(alias, branch):
+    return f'{alias}: ref(qualifiedName: {quote("refs/heads/" + branch)}) ' \
+           f'{{ target {{ oid }} }}'
+
+
+def open_pull_requests_query(alias, to_branch):
+    return f'{alias}: pullRequests(states: OPEN, ' \
+           f'baseRefName: {quote(to_branch)}, first: {PAGE_SIZE}) ' \
+           f'{{ totalCount nodes {{ number title }} }}'
+
+
+def repository_query(alias, repo, fields_queries):
+    return f'{alias}: repository(owner: {quote(GITHUB_OWNER)}, ' \
+           f'name: {quote(repo)}) {{ {" ".join(fields_queries)} }}'
+
+
+def execute_graphql_query(query):
+    try:
+        response = request_with_retry(github_session, 'POST', graphql_url,
+                                      GITHUB_SERVICE, json={"query": query})
+    except requests.RequestException as e:
+        logger.warning(f"Failed to execute GraphQL query: {e}")
+        return {}
+
+    if response.status_code != http.HTTPStatus.OK:
+        logger.warning(f"Failed to execute GraphQL query, "
+                       f"Status code: {response.status_code}, "
+                       f"Response body: {response.text}")
+        return {}
+
+    result = response.json()
+
+    if result.get('errors'):
+        logger.warning(f"GraphQL query errors: {result['errors']}")
+
+    return result.get('data') or {}
+
+
+class PageRequest:
+    """
+    Pending page of a paged connection, i.e. the commits of one branch
+    pair or the open pull requests of one repo.
+    """
+
+    def __init__(self, repo, index, cursor, base_branch=None,
+                 compare_branch=None, to_branch=None):
+        self.repo = repo
+        self.index = index
+        self.cursor = cursor
+        self.base_branch = base_branch
+        self.compare_branch = compare_branch
+        self.to_branch = to_branch
+        self.total = None
+
+    def is_pull_requests(self):
+        return self.to_branch is not None
+
+    def field_query(self, alias):
+        if self.is_pull_requests():
+            return pull_requests_query(alias, self.to_branch, self.cursor)
+
+        return compare_query(alias, self.base_branch, self.compare_branch,
+                             self.cursor)
+
+
+def extract_connection(field, page_request):
+    """
+    :return: the connection, None when it could not be read, a missing
+             branch has nothing to compare
+    """
+    if page_request.is_pull_requests():
+        return field
+
+    # the ref is null when the compare branch is missing, the compare
+    # when the base branch is
+    compare = (field or {}).get('compare')
+
+    if compare is None:
+        return EMPTY_CONNECTION
+
+    page_request.total = compare.get('aheadBy')
+
+    return compare.get('commits')
+
+
+def fetch_pages(page_requests, on_nodes):
+    """
+    Fetch all the pages of the requested connections, many connections of
+    many repos are aliased in a single query.
+
+    :param page_requests: first pages to fetch
+    :param on_nodes: called with the page request and its nodes, returns
+                     False when no more pages are needed
+    :return: the page requests which could not be read, e.g. a failed
+             query
+    """
+    failed_page_requests = []
+
+    while page_requests:
+        next_page_requests = []
+
+        chunk_size = GITHUB_GRAPHQL_CONNECTIONS_PER_QUERY
+
+        chunks = [page_requests[chunk_start:chunk_start + chunk_size]
+                  for chunk_start in range(0, len(page_requests),
+                                           chunk_size)]
+
+        queries = []
+        for chunk in chunks:
+            repo_queries = []
+            for i, page_request in enumerate(chunk):
+                repo_queries.append(repository_query(
+                        f'r{i}', page_request.repo,
+                        [page_request.field_query('f')]))
+
+            queries.append('query { ' + ' '.join(repo_queries) + ' }')
+
+        chunks_data = engine.map(GITHUB_SERVICE, execute_graphql_query,
+                                 queries)
+
+        for chunk, data in zip(chunks, chunks_data):
+            for i, page_request in enumerate(chunk):
+                repository = data.get(f'r{i}')
+
+                if repository is None:
+                    logger.warning(f"Missing repository: {page_request.repo}")
+                    failed_page_requests.append(page_request)
+                    continue
+
+                connection = extract_connection(repository.get('f'),
+                                                page_request)
+
+                if connection is None:
+                    failed_page_requests.append(page_request)
+                    continue
+
+                need_more = on_nodes(page_request, connection['nodes'])
+
+                page_info = connection['pageInfo']
+                if need_more and page_info['hasNextPage']:
+                    page_request.cursor = page_info['endCursor']
+                    next_page_requests.append(page_request)
+
+        page_requests = next_page_requests
+
+    return failed_page_requests
+
+
+def node_author(node):
+    """
+    :param node: commit node
+    :return: GitHub login of the author, else the git author name
+    """
+    author = node.get('author') or {}
+
+    return (author.get('user') or {}).get('login') or author.get('name')
+
+
+def get_branch_pairs_commit_messages(repo_branch_pairs):
+    """
+    :param repo_branch_pairs: list of repo, base branch, compare branch
+    :return: list of commit messages and their authors per pair, in the
+             order of the pairs, None for the pairs which could not be read
+             completely
+    """
+    all_commit_messages = [[] for _ in repo_branch_pairs]
+
+    page_requests = [PageRequest(repo, i, None,
+                                 base_branch=base_branch,
+                                 compare_branch=compare_branch)
+                     for i, (repo, base_branch, compare_branch) in
+                     enumerate(repo_branch_pairs)]
+
+    def on_nodes(page_request, nodes):
+        commit_messages = all_commit_messages[page_request.index]
+
+        commit_messages.extend(
+                (node['message'], node_author(node)) for node in
+                nodes[:MAX_COMMITS_PER_COMPARE - len(commit_messages)])
+
+        if len(commit_messages) < MAX_COMMITS_PER_COMPARE:
+            return True
+
+        total = page_request.total or 0
+        if total > len(commit_messages):
+            commit_messages.append(
+                    (more_commits_marker(total - len(commit_messages)), None))
+
+        return False
+
+    for page_request in fetch_pages(page_requests, on_nodes):
+        all_commit_messages[page_request.index] = None
+
+    return all_commit_messages
+
+
+def get_repos_pull_requests_to_branch(repos, to_branch):
+    """
+    Drop-in replacement of calling git_utils.get_pull_requests_to_branch
+    for each repo, all the pages of open pull requests are fetched.
+
+    :param repos:
+    :param to_branch:
+    :return: repo to list of PullRequestInfo
+    """
+    repo_to_pr_infos = {repo: [] for repo in repos}
+
+    page_requests = [PageRequest(repo, 0, None, to_branch=to_branch)
+                     for repo in repos]
+
+    def on_nodes(page_request, nodes):
+        for node in nodes:
+            author = node['author']['login'] if node['author'] else 'ghost'
+            repo_to_pr_infos[page_request.repo].append(
+                    PullRequestInfo(node['title'], node['url'], author))
+
+        return True
+
+    fetch_pages(page_requests, on_nodes)
+
+    return repo_to_pr_infos
+
+
+def repository_fingerprint(repository, branches, pr_branches):
+    heads = []
+    for i, _ in enumerate(branches):
+        head = repository.get(f'b{i}')
+        heads.append(head['target']['oid'] if head else None)
+
+    all_pull_requests = []
+    for i, _ in enumerate(pr_branches):
+        pull_requests = repository.get(f'prs{i}') or {}
+        open_pull_requests = sorted(
+                (node['number'], node['title'])
+                for node in pull_requests.get('nodes', []))
+
+        all_pull_requests.append([pull_requests.get('totalCount'),
+                                  open_pull_requests])
+
+    return json.dumps([heads, all_pull_requests])
+
+
+def query_repositories(repos, fields_queries):
+    """
+    Query the same fields of many repos, a chunk of repos per query.
+
+    :param repos:
+    :param fields_queries:
+    :return: repo to repository data, missing for the repos failed to read
+    """
+    chunk_size = GITHUB_GRAPHQL_CONNECTIONS_PER_QUERY
+
+    chunks = [repos[chunk_start:chunk_start + chunk_size]
+              for chunk_start in range(0, len(repos), chunk_size)]
+
+    queries = ['query { ' + ' '.join(
+            repository_query(f'r{i}', repo, fields_queries)
+            for i, repo in enumerate(chunk)) + ' }' for chunk in chunks]
+
+    chunks_data = engine.map(GITHUB_SERVICE, execute_graphql_query, queries)
+
+    repo_to_repository = {}
+
+    for chunk, data in zip(chunks, chunks_data):
+        for i, repo in enumerate(chunk):
+            repository = data.get(f'r{i}')
+
+            if repository is not None:
+                repo_to_repository[repo] = repository
+
+    return repo_to_repository
+
+
+def heads_queries(branches):
+    return [head_query(f'b{i}', branch) for i, branch in enumerate(branches)]
+
+
+def get_repos_fingerprints(repos, branches, pr_branches):
+    """
+    Read the head commit of every branch and the open pull requests of
+    many repos with a single query per chunk of repos. Any change of the
+    compares or of the pull requests shape changes the fingerprint.
+
+    :param repos:
+    :param branches:
+    :param pr_branches: the branches whose open pull requests are shown
+    :return: repo to fingerprint, missing for the repos failed to read
+    """
+    fields_queries = heads_queries(branches) + \
+        [open_pull_requests_query(f'prs{i}', branch)
+         for i, branch in enumerate(pr_branches)]
+
+    return {repo: repository_fingerprint(repository, branches, pr_branches)
+            for repo, repository in
+            query_repositories(repos, fields_queries).items()}
+
+
+def get_repos_branches_heads(repos, branches):
+    """
+    :param repos:
+    :param branches:
+    :return: repo to branch to head commit SHA, missing branches are None
+    """
+    repo_to_heads = {}
+
+    for repo, repository in query_repositories(
+            repos, heads_queries(branches)).items():
+        heads = {}
+
+        for i, branch in enumerate(branches):
+            head = repository.get(f'b{i}')
+            heads[branch] = head['target']['oid'] if head else None
+
+        repo_to_heads[repo] = heads
+
+    return repo_to_heads
@@ -0,0 +1,241 @@
+import base64
+import logging
+import os
+import shutil
+import subprocess
+
+from async_engine import engine, GIT_SERVICE
+from config import (
+    GITHUB_API_TOKEN,
+    GITHUB_OWNER,
+    GIT_MIRROR_DIR,
+    GIT_MIRROR_URL,
+    GIT_TIMEOUT_SECONDS,
+    MAX_COMMITS_PER_COMPARE,
+)
+from git_utils import more_commits_marker
+
+logger = logging.getLogger(__name__)
+
+BRANCHES_REFSPEC = '+refs/heads/*:refs/heads/*'
+
+
+class GitCommandError(Exception):
+    pass
+
+
+def mirror_url(repo):
+    return GIT_MIRROR_URL.format(owner=GITHUB_OWNER, repo=repo)
+
+
+def mirror_path(repo):
+    return os.path.join(GIT_MIRROR_DIR, f"{repo}.git")
+
+
+def auth_config_env(url):
+    """
+    The token is passed in the environment of every fetch, so it is never
+    written to the config of the mirrors nor shown in the command line of
+    the git processes.
+    """
+    if not GITHUB_API_TOKEN or not url.startswith('https://'):
+        return {}
+
+    credentials = base64.b64encode(
+            f"x-access-token:{GITHUB_API_TOKEN}".encode()).decode()
+
+    return {'GIT_CONFIG_COUNT': '1',
+            'GIT_CONFIG_KEY_0': 'http.extraHeader',
+            'GIT_CONFIG_VALUE_0': f'Authorization: Basic {credentials}'}
+
+
+def run_git(args, git_dir=None, config_env=None):
+    """
+    :param args: git command and its arguments
+    :param git_dir: repository to run the command in
+    :param config_env: `GIT_CONFIG_*` environment variables
+    :return: stdout
+    """
+    command = ['git']
+    if git_dir:
+        command += ['--git-dir', git_dir]
+    command += args
+
+    try:
+        result = subprocess.run(command, capture_output=True,
+                                timeout=GIT_TIMEOUT_SECONDS,
+                                env={**os.environ,
+                                     'GIT_TERMINAL_PROMPT': '0',
+                                     **(config_env or {})})
+    except subprocess.TimeoutExpired:
+        raise GitCommandError(f"git {args[0]} timed out after "
+                              f"{GIT_TIMEOUT_SECONDS}s")
+
+    if result.returncode != 0:
+        raise GitCommandError(
+                f"git {args[0]} failed with exit code {result.returncode}: "
+                f"{result.stderr.decode(errors='replace').strip()}")
+
+    return result.stdout.decode(errors='replace')
+
+
+def update_mirror(repo):
+    """
+    Clone the bare mirror of the repo or fetch only what changed since the
+    last update. Only the branches and the commits are fetched, no file
+    contents are needed for the commit messages.
+
+    :param repo:
+    :return: True if the mirror is up to date, a failed update keeps the
+             last fetched commits
+    """
+    url = mirror_url(repo)
+    path = mirror_path(repo)
+    config_env = auth_config_env(url)
+
+    try:
+        if os.path.isdir(path):
+            run_git(['fetch', '--prune', '--quiet', 'origin',
+                     BRANCHES_REFSPEC],
+                    git_dir=path, config_env=config_env)
+        else:
+            # a clone that fails half way must not look like a mirror
+            tmp_path = f"{path}.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+            run_git(['clone', '--bare', '--quiet', '--filter=blob:none',
+                     url, tmp_path],
+                    config_env=config_env)
+
+            os.replace(tmp_path, path)
+    except GitCommandError as e:
+        logger.warning(f"Failed to update mirror, repo: {repo}, {e}")
+        return False
+
+    return True
+
+
+def update_mirrors(repos):
+    """
+    :param repos:
+    :return: the repos whose mirrors failed to update
+    """
+    os.makedirs(GIT_MIRROR_DIR, exist_ok=True)
+
+    results = engine.map(GIT_SERVICE, update_mirror, repos)
+
+    failed_repos = [repo for repo, updated in zip(repos, results)
+                    if not updated]
+
+    logger.info(f"Mirrors updated: {len(repos) - len(failed_repos)}, "
+                f"failed: {len(failed_repos)}")
+
+    return failed_repos
+
+
+def read_mirror_heads(path):
+    """
+    :param path: of the mirror
+    :return: branch to head commit SHA
+    """
+    output = run_git(['for-each-ref', '--format=%(objectname) %(refname)',
+                      'refs/heads/'],
+                     git_dir=path)
+
+    heads = {}
+
+    for line in output.splitlines():
+        oid, _, ref = line.partition(' ')
+        heads[ref[len('refs/heads/'):]] = oid
+
+    return heads
+
+
+def get_mirror_branches_heads(repo, branches):
+    """
+    :param repo:
+    :param branches:
+    :return: branch to head commit SHA, missing branches are None
+    """
+    path = mirror_path(repo)
+    if not os.path.isdir(path):
+        return {branch: None for branch in branches}
+
+    try:
+        heads = read_mirror_heads(path)
+    except GitCommandError as e:
+        logger.warning(f"Failed to read mirror heads, repo: {repo}, {e}")
+        heads = {}
+
+    return {branch: heads.get(branch) for branch in branches}
+
+
+def get_mirrors_branches_heads(repos, branches):
+    """
+    Same result as git_graphql_utils.get_repos_branches_heads, read from
+    the local mirrors.
+    """
+    results = engine.map(GIT_SERVICE, get_mirror_branches_heads,
+                         repos, [branches] * len(repos))
+
+    return dict(zip(repos, results))
+
+
+def iter_mirror_commit_messages(repo, base_branch, compare_branch):
+    """
+    Same messages as git_utils.iter_commit_messages, read from the local
+    mirror: the commits of the base branch which are not in the compare
+    branch, oldest first, capped to MAX_COMMITS_PER_COMPARE. The authors
+    are the git author names, the mirror knows no GitHub login.
+
+    :raise GitCommandError: when the mirror could not be read, a missing
+                            branch yields no message
+    """
+    path = mirror_path(repo)
+    revision_range = f"refs/heads/{compare_branch}..refs/heads/{base_branch}"
+
+    try:
+        count_output = run_git(['rev-list', '--count', revision_range],
+                               git_dir=path)
+    except GitCommandError:
+        if not os.path.isdir(path):
+            raise
+
+        heads = read_mirror_heads(path)
+
+        if base_branch in heads and compare_branch in heads:
+            raise
+
+        # a missing branch has nothing to compare, it is not a failure
+        logger.info(f"Nothing to compare, repo: {repo}, "
+                    f"{compare_branch}..{base_branch}")
+        return
+
+    try:
+        total_commits = int(count_output)
+
+        # the skip is applied before the reverse, so the oldest commits
+        # are kept as the compare API does
+        skip = max(0, total_commits - MAX_COMMITS_PER_COMPARE)
+
+        output = run_git(['log', '-z', '--format=%an%x00%B', '--reverse',
+                          f'--skip={skip}', revision_range],
+                         git_dir=path)
+    except ValueError as e:
+        raise GitCommandError(f"Invalid commits count, repo: {repo}, "
+                              f"{compare_branch}..{base_branch}, {e}")
+
+    # every author and every message is terminated with a NUL
+    fields = output.split('\0')
+    if not fields[-1]:
+        fields.pop()
+
+    authors, messages = fields[0::2], fields[1::2]
+
+    for author, message in zip(authors, messages):
+        yield message.rstrip('\n'), author
+
+    yielded = len(messages)
+
+    if total_commits > yielded:
+        yield more_commits_marker(total_commits - yielded), None
@@ -1,13 +1,22 @@
 import http
 import logging
+import re
 
-import requests as requests
+import requests
 
+from async_engine import GITHUB_SERVICE
 from config import (
     GITHUB_API_URL,
     GITHUB_API_TOKEN,
     GITHUB_OWNER,
+    GITHUB_CACHE_DIR,
+    GITHUB_CACHE_MAX_ENTRIES,
+    GITHUB_CONCURRENCY,
+    MAX_COMMITS_PER_COMPARE,
 )
+from http_cache import ResponseCache
+from http_utils import create_session, request_with_retry
+from metrics import instrument_session
 
 github_headers = {
     'Authorization': f'Bearer {GITHUB_API_TOKEN}',
@@ -15,8 +24,23 @@ github_headers = {
     'X-GitHub-Api-Version': '2022-11-28'
 }
 
+github_session = create_session(github_headers, GITHUB_CONCURRENCY)
+
+instrument_session(github_session, GITHUB_SERVICE)
+
+github_response_cache = ResponseCache(GITHUB_CACHE_MAX_ENTRIES,
+                                      cache_dir=GITHUB_CACHE_DIR)
+
 logger = logging.getLogger(__name__)
 
+COMPARE_PAGE_SIZE = 100
+
+MORE_COMMITS_MARKER_PATTERN = re.compile(r'\+(\d+) more commits')
+
+
+class GitHubApiError(Exception):
+    pass
+
 
 class PullRequestInfo:
     def __init__(self, title, url, author):
@@ -25,48 +49,159 @@ class PullRequestInfo:
         self.author = author
 
 
-def get_commit_messages(repo, base_branch, compare_branch):
-    url = f'{GITHUB_API_URL}/repos/{GITHUB_OWNER}/{repo}/compare/{compare_branch}...{base_branch}'
-
-    response = requests.get(url, headers=github_headers)
+def github_get_json(url, params=None):
+    """
+    Conditional GET, the cached body is reused when GitHub answers with
+    304 Not Modified, which does not count against the rate limit.
+
+    :param url:
+    :param params:
+    :return: status code (None when GitHub could not be reached), parsed
+             body (None on failure), response text
+    """
+    cache_key = ResponseCache.cache_key(url, params)
+    cached = github_response_cache.get(cache_key)
+
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    try:
+        response = request_with_retry(github_session, 'GET', url,
+                                      GITHUB_SERVICE, params=params,
+                                      headers=headers)
+    except requests.RequestException as e:
+        return None, None, str(e)
+
+    if response.status_code == http.HTTPStatus.NOT_MODIFIED and \
+            cached is not None:
+        github_response_cache.record_hit()
+        return http.HTTPStatus.OK, cached.body, response.text
+
+    github_response_cache.record_miss()
 
     if response.status_code != http.HTTPStatus.OK:
-        logger.warning(f"Failed to get commit messages, "
-                       f"repo: {repo}, {compare_branch}...{base_branch}, "
-                       f"Status code: {response.status_code}, "
-                       f"Response body: {response.text}")
-        return []
+        return response.status_code, None, response.text
 
     data = response.json()
 
-    if 'commits' not in data:
-        logger.warning(f"Missing commits, "
-                       f"repo: {repo}, {compare_branch}...{base_branch}, "
-                       f"Status code: {response.status_code}, "
-                       f"Response body: {response.text}")
-        return []
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    if etag or last_modified:
+        github_response_cache.put(cache_key, etag, last_modified, data)
+
+    return response.status_code, data, response.text
+
+
+def more_commits_marker(count):
+    return f"+{count} more commits"
+
+
+def parse_more_commits_marker(line):
+    """
+    :param line: display line of a branch pair
+    :return: count of the commits not read, None if not a marker
+    """
+    match = MORE_COMMITS_MARKER_PATTERN.fullmatch(line)
+
+    return int(match.group(1)) if match else None
+
 
-    commit_messages = [commit['commit']['message']
-                       for commit in data['commits']]
+def commit_author(commit):
+    """
+    :param commit: of a compare response
+    :return: GitHub login of the author, else the git author name
+    """
+    if commit.get('author'):
+        return commit['author']['login']
 
-    return commit_messages
+    return (commit['commit'].get('author') or {}).get('name')
+
+
+def iter_commit_messages(repo, base_branch, compare_branch):
+    """
+    Page through all the commits of the comparison, a single compare
+    response is capped by GitHub to 250 commits.
+
+    At most MAX_COMMITS_PER_COMPARE messages are yielded with their
+    authors, the rest is summarized with a single "+N more commits"
+    message without author.
+
+    :raise GitHubApiError: when a page could not be read, the messages
+                           yielded so far are incomplete, a missing branch
+                           yields no message
+    """
+    url = f'{GITHUB_API_URL}/repos/{GITHUB_OWNER}/{repo}/compare/{compare_branch}...{base_branch}'
+
+    yielded = 0
+    page = 1
+
+    while True:
+        params = {"per_page": COMPARE_PAGE_SIZE, "page": page}
+
+        status_code, data, response_text = github_get_json(url, params)
+
+        # a missing branch has nothing to compare, it is not a failure
+        if status_code == http.HTTPStatus.NOT_FOUND and page == 1:
+            logger.info(f"Nothing to compare, "
+                        f"repo: {repo}, {compare_branch}...{base_branch}, "
+                        f"Response body: {response_text}")
+            return
+
+        if status_code != http.HTTPStatus.OK:
+            raise GitHubApiError(
+                    f"Failed to get commit messages, "
+                    f"repo: {repo}, {compare_branch}...{base_branch}, "
+                    f"page: {page}, "
+                    f"Status code: {status_code}, "
+                    f"Response body: {response_text}")
+
+        if 'commits' not in data:
+            raise GitHubApiError(
+                    f"Missing commits, "
+                    f"repo: {repo}, {compare_branch}...{base_branch}, "
+                    f"page: {page}, "
+                    f"Status code: {status_code}, "
+                    f"Response body: {response_text}")
+
+        total_commits = data.get('total_commits', 0)
+
+        for commit in data['commits']:
+            if yielded >= MAX_COMMITS_PER_COMPARE:
+                break
+
+            yield commit['commit']['message'], commit_author(commit)
+            yielded += 1
+
+        if yielded >= MAX_COMMITS_PER_COMPARE:
+            if total_commits > yielded:
+                yield more_commits_marker(total_commits - yielded), None
+            return
+
+        if len(data['commits']) < COMPARE_PAGE_SIZE or \
+                yielded >= total_commits:
+            return
+
+        page += 1
 
 
 def get_pull_requests_to_branch(repo, to_branch):
     url = f"{GITHUB_API_URL}/repos/{GITHUB_OWNER}/{repo}/pulls"
     params = {"state": "open", "base": f"{to_branch}"}
 
-    response = requests.get(url, headers=github_headers, params=params)
+    status_code, pull_requests, response_text = github_get_json(url, params)
 
-    if response.status_code != http.HTTPStatus.OK:
+    if status_code != http.HTTPStatus.OK:
         logger.warning(f"Failed to get pull requests, "
                        f"repo: {repo}, {to_branch}, "
-                       f"Status code: {response.status_code}, "
-                       f"Response body: {response.text}")
+                       f"Status code: {status_code}, "
+                       f"Response body: {response_text}")
         return []
 
-    pull_requests = response.json()
-
     pr_infos = []
     for pr in pull_requests:
         pr_infos.append(
@@ -0,0 +1,114 @@
+import collections
+import hashlib
+import json
+import threading
+
+from disk_cache import DiskCache
+
+
+class CachedResponse:
+    def __init__(self, etag, last_modified, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+
+
+class ResponseCache:
+    """
+    Cache of response bodies with their ETag / Last-Modified validators.
+
+    Entries are kept in memory (LRU bounded) and, when cache_dir is set,
+    also on disk, so they survive process restarts. The files are bounded
+    by the same max_entries, the least recently used ones are removed.
+    """
+
+    def __init__(self, max_entries, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._disk = DiskCache(cache_dir, max_files=max_entries,
+                               name='responses') if cache_dir else None
+
+    @staticmethod
+    def cache_key(url, params=None):
+        params_text = json.dumps(params or {}, sort_keys=True)
+
+        return hashlib.sha1(f"{url} {params_text}".encode()).hexdigest()
+
+    def get(self, cache_key):
+        with self._lock:
+            cached = self._entries.get(cache_key)
+
+            if cached is not None:
+                self._entries.move_to_end(cache_key)
+                return cached
+
+        cached = self._load(cache_key)
+
+        if cached is not None:
+            self._put_in_memory(cache_key, cached)
+
+        return cached
+
+    def put(self, cache_key, etag, last_modified, body):
+        cached = CachedResponse(etag, last_modified, body)
+
+        self._put_in_memory(cache_key, cached)
+        self._save(cache_key, cached)
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+        if self._disk is not None:
+            stats["disk"] = self._disk.stats()
+
+        return stats
+
+    def _put_in_memory(self, cache_key, cached):
+        with self._lock:
+            self._entries[cache_key] = cached
+            self._entries.move_to_end(cache_key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, cache_key):
+        if self._disk is None:
+            return None
+
+        data = self._disk.load(cache_key)
+
+        if data is None:
+            return None
+
+        return CachedResponse(data["etag"], data["last_modified"],
+                              data["body"])
+
+    def _save(self, cache_key, cached):
+        if self._disk is None:
+            return
+
+        self._disk.save(cache_key, {"etag": cached.etag,
+                                    "last_modified": cached.last_modified,
+                                    "body": cached.body})
@@ -0,0 +1,114 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_SIZE, HTTP_TIMEOUT_SECONDS, MAX_REQUEST_RETRIES
+from metrics import RETRIES_TOTAL
+from rate_limiter import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# the first attempt and its retries
+MAX_REQUEST_ATTEMPTS = MAX_REQUEST_RETRIES + 1
+
+RETRY_BASE_SECONDS = 1
+
+RETRY_MAX_SECONDS = 30
+
+
+class PooledSession(requests.Session):
+    """
+    Keep-alive session with a default timeout for every request.
+
+    A single instance is shared by all the worker threads and reused
+    between the loop iterations, so the TCP and TLS connections are kept.
+    """
+
+    def __init__(self, headers, pool_size, timeout):
+        super().__init__()
+
+        self.timeout = timeout
+
+        self.headers.update(headers)
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        return super().request(method, url, **kwargs)
+
+
+def create_session(headers, concurrency):
+    """
+    :param headers:
+    :param concurrency: max concurrent requests of the service, the size of
+                        the pool unless HTTP_POOL_SIZE is positive
+    :return: session shared by all the workers of the service
+    """
+    pool_size = HTTP_POOL_SIZE if HTTP_POOL_SIZE > 0 else concurrency
+
+    return PooledSession(headers, pool_size, HTTP_TIMEOUT_SECONDS)
+
+
+def request_with_retry(session, method, url, service, **kwargs):
+    """
+    Retry the timeouts and the connection errors with a jittered
+    exponential backoff, the responses are returned whatever their status.
+
+    :param session:
+    :param method:
+    :param url:
+    :param service: label of the retries metric
+    :return: response
+    :raise requests.RequestException: when all the retries failed
+    """
+    for attempt in range(1, MAX_REQUEST_ATTEMPTS + 1):
+        try:
+            return session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            if attempt >= MAX_REQUEST_ATTEMPTS:
+                raise
+
+            delay = backoff_delay(attempt, RETRY_BASE_SECONDS,
+                                  RETRY_MAX_SECONDS)
+
+            logger.warning(f"Request failed on attempt {attempt}, "
+                           f"{method} {url}, retry in {delay:.1f}s: {e}")
+
+            RETRIES_TOTAL.labels(service, 'connection').inc()
+
+            time.sleep(delay)
+
+
+def get_pool_stats(session):
+    """
+    :param session:
+    :return: per host number of opened connections, served requests and
+             idle connections in the pool
+    """
+    stats = {}
+
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+
+            if pool is None:
+                continue
+
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": sum(1 for connection in pool.pool.queue
+                            if connection is not None) if pool.pool else 0,
+            }
+
+    return stats
@@ -1,11 +1,27 @@
 import base64
 import concurrent.futures
+import http
 import logging
-import re
+import math
+import threading
+import time
 
-from jira import JIRA
-
-from config import JIRA_USERNAME, JIRA_API_TOKEN, JIRA_API_URL
+from async_engine import engine, JIRA_SERVICE
+from config import (
+    JIRA_USERNAME,
+    JIRA_API_TOKEN,
+    JIRA_API_URL,
+    JIRA_BACKEND,
+    JIRA_CACHE_MAX_SIZE,
+    JIRA_CACHE_TTL_SECONDS,
+    JIRA_CACHE_SYNC_SECONDS,
+    JIRA_CACHE_FILE,
+    JIRA_CONCURRENCY,
+    JIRA_SEARCH_CHUNK_SIZE,
+)
+from http_utils import create_session
+from metrics import instrument_session
+from ticket_cache import TicketCache
 
 jira_auth_encoded = base64.b64encode(
         f"{JIRA_USERNAME}:{JIRA_API_TOKEN}".encode()).decode()
@@ -15,50 +31,293 @@ jira_headers = {
     'Authorization': f'Basic {jira_auth_encoded}',
 }
 
-jira = JIRA(JIRA_API_URL, basic_auth=(JIRA_USERNAME, JIRA_API_TOKEN))
+jira_session = create_session(jira_headers, JIRA_CONCURRENCY)
+
+instrument_session(jira_session, JIRA_SERVICE)
+
+jira_search_url = f"{JIRA_API_URL}/rest/api/2/search"
+
+jira_client = None
+
+jira_client_lock = threading.Lock()
+
+# the cached values are the title and the status of the tickets
+TICKET_CACHE_FORMAT = 2
+
+ticket_cache = TicketCache(JIRA_CACHE_MAX_SIZE, JIRA_CACHE_TTL_SECONDS,
+                           cache_file=JIRA_CACHE_FILE,
+                           cache_format=TICKET_CACHE_FORMAT)
+
+ticket_cache_sync_lock = threading.Lock()
+
+in_flight_tickets = {}
+
+in_flight_tickets_lock = threading.Lock()
+
+
+JIRA_TICKET_FIELDS = 'summary,status'
+
+JIRA_SEARCH_PAGE_SIZE = 100
+
+
+class JiraTicketInfo:
+    def __init__(self, title, status):
+        self.title = title
+        self.status = status
+
+
+def jira_ticket_info_from_issue(issue):
+    status = issue.fields.status.name if issue.fields.status else ''
+
+    return JiraTicketInfo(issue.fields.summary, status)
+
+
+def jira_ticket_info_from_json(issue):
+    fields = issue.get('fields') or {}
+    status = (fields.get('status') or {}).get('name', '')
+
+    return JiraTicketInfo(fields.get('summary') or '', status)
+
+
+def get_jira_client():
+    """
+    The jira library is imported and its client created on the first
+    search, so the import of this module makes no request.
+    """
+    global jira_client
+
+    with jira_client_lock:
+        if jira_client is None:
+            from jira import JIRA
+
+            jira_client = JIRA(JIRA_API_URL,
+                               basic_auth=(JIRA_USERNAME, JIRA_API_TOKEN),
+                               get_server_info=False)
+
+            instrument_session(jira_client._session, JIRA_SERVICE)
+
+        return jira_client
+
+
+def rest_search_jira_issues(jql, max_results):
+    """
+    Check https://developer.atlassian.com/cloud/jira/platform/rest/v2/api-group-issue-search/#api-rest-api-2-search-post
+
+    :param jql:
+    :param max_results: None for all the issues
+    :return: list of ticket id and JiraTicketInfo
+    """
+    issues = []
+
+    while True:
+        page_size = JIRA_SEARCH_PAGE_SIZE if max_results is None \
+            else min(JIRA_SEARCH_PAGE_SIZE, max_results - len(issues))
+
+        response = jira_session.post(jira_search_url, json={
+            "jql": jql,
+            "fields": JIRA_TICKET_FIELDS.split(','),
+            "startAt": len(issues),
+            "maxResults": page_size,
+            "validateQuery": "none",
+        })
+
+        if response.status_code != http.HTTPStatus.OK:
+            raise RuntimeError(f"Jira search failed, "
+                               f"status code: {response.status_code}, "
+                               f"response body: {response.text}")
+
+        page = response.json()
+        page_issues = page.get('issues') or []
+
+        issues.extend((issue['key'], jira_ticket_info_from_json(issue))
+                      for issue in page_issues)
+
+        if not page_issues or len(issues) >= page.get('total', 0) or \
+                (max_results is not None and len(issues) >= max_results):
+            return issues
 
 
-def get_jira_ticket_title(ticket_id):
-    if 'LITE-000' in ticket_id:
-        return ticket_id, ''
+def search_jira_issues(jql, max_results=None):
+    """
+    :param jql:
+    :param max_results: None for all the issues
+    :return: list of ticket id and JiraTicketInfo
+    """
+    if JIRA_BACKEND == 'rest':
+        return rest_search_jira_issues(jql, max_results)
+
+    issues = get_jira_client().search_issues(
+            jql,
+            fields=JIRA_TICKET_FIELDS,
+            maxResults=max_results if max_results is not None else False,
+            validate_query=False)
+
+    return [(issue.key, jira_ticket_info_from_issue(issue))
+            for issue in issues]
+
+
+def search_jira_tickets(ticket_ids):
+    """
+    Resolve a chunk of tickets with one `key in (...)` JQL search.
+
+    The query is not validated, so missing or deleted keys are just not
+    returned instead of failing the whole search.
+
+    :param ticket_ids:
+    :return: ticket id to JiraTicketInfo, None on failure
+    """
+    jql = f"key in ({', '.join(ticket_ids)})"
 
     try:
-        issue = jira.issue(ticket_id)
-    except Exception as e:
-        error_message = str(e)
+        issues = search_jira_issues(jql, max_results=len(ticket_ids))
+    except Exception:
+        logging.exception(f"Failed to search tickets: {jql}")
+        return None
 
-        if 'HTTP 404' in error_message:
-            logging.warning(f"Got 404, ticket not found: {ticket_id}")
-        else:
-            logging.exception(f"Failed to get summary for {ticket_id}")
+    ticket_id_to_info = dict(issues)
+
+    for ticket_id in ticket_ids:
+        if ticket_id not in ticket_id_to_info:
+            logging.warning(f"Ticket not found: {ticket_id}")
+            ticket_id_to_info[ticket_id] = JiraTicketInfo('', '')
+
+    return ticket_id_to_info
+
+
+def sync_jira_ticket_cache():
+    """
+    Refresh the cached titles with a single JQL query for the tickets
+    updated since the last sync, instead of reading every ticket again.
+    """
+    with ticket_cache_sync_lock:
+        now = time.time()
+
+        if ticket_cache.last_sync is not None and \
+                now - ticket_cache.last_sync < JIRA_CACHE_SYNC_SECONDS:
+            return
+
+        projects = sorted(set(ticket_id.split('-')[0]
+                              for ticket_id in ticket_cache.ticket_ids()))
+
+        if ticket_cache.last_sync is None or not projects:
+            ticket_cache.last_sync = now
+            return
+
+        # relative JQL dates avoid any timezone mismatch with the Jira user
+        minutes = math.ceil((now - ticket_cache.last_sync) / 60) + 1
+        jql = f"project in ({', '.join(projects)}) " \
+              f"AND updated >= -{minutes}m"
+
+        try:
+            issues = search_jira_issues(jql)
+        except Exception:
+            logging.exception(f"Failed to sync ticket cache: {jql}")
+            return
+
+        updated = 0
+        for ticket_id, ticket_info in issues:
+            if ticket_cache.update_if_present(
+                    ticket_id, (ticket_info.title, ticket_info.status)):
+                updated += 1
+
+        ticket_cache.last_sync = now
+        ticket_cache.save()
 
-        return ticket_id, ''
+        logging.info(f"Synced ticket cache, updated tickets: {updated}, "
+                     f"cached: {len(ticket_cache)}")
 
-    return ticket_id, issue.fields.summary
 
+def resolve_jira_tickets(ticket_ids):
+    chunks = [ticket_ids[i:i + JIRA_SEARCH_CHUNK_SIZE]
+              for i in range(0, len(ticket_ids), JIRA_SEARCH_CHUNK_SIZE)]
 
-def get_jira_tickets_titles(ticket_ids):
-    ticket_id_to_title = {}
+    chunks_results = engine.map(JIRA_SERVICE, search_jira_tickets, chunks)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    ticket_id_to_info = {}
 
-        futures = []
+    for chunk, chunk_ticket_id_to_info in zip(chunks, chunks_results):
+        logging.info(f"Search tickets result: {len(chunk)} tickets")
 
-        for ticket_id in ticket_ids:
-            futures.append(executor.submit(get_jira_ticket_title,
-                                           ticket_id=ticket_id))
+        if chunk_ticket_id_to_info is None:
+            for ticket_id in chunk:
+                ticket_id_to_info[ticket_id] = JiraTicketInfo('', '')
+            continue
+
+        for ticket_id, ticket_info in chunk_ticket_id_to_info.items():
+            ticket_cache.put(ticket_id,
+                             (ticket_info.title, ticket_info.status))
+            ticket_id_to_info[ticket_id] = ticket_info
+
+    ticket_cache.save()
+
+    return ticket_id_to_info
+
+
+def get_jira_tickets_infos(ticket_ids):
+    """
+    Resolve each ticket only once: cached tickets are not fetched and
+    tickets already being fetched by another caller are awaited instead
+    of being requested again.
+
+    :param ticket_ids:
+    :return: ticket id to JiraTicketInfo
+    """
+    sync_jira_ticket_cache()
+
+    ticket_id_to_info = {}
+    missing_ticket_ids = []
+
+    for ticket_id in set(ticket_ids):
+        if 'LITE-000' in ticket_id:
+            ticket_id_to_info[ticket_id] = JiraTicketInfo('', '')
+            continue
+
+        cached = ticket_cache.get(ticket_id)
+
+        if cached is None:
+            missing_ticket_ids.append(ticket_id)
+        else:
+            ticket_id_to_info[ticket_id] = JiraTicketInfo(*cached)
+
+    if not missing_ticket_ids:
+        return ticket_id_to_info
+
+    own_futures = {}
+    awaited_futures = {}
+
+    with in_flight_tickets_lock:
+        for ticket_id in sorted(missing_ticket_ids):
+            if ticket_id in in_flight_tickets:
+                awaited_futures[ticket_id] = in_flight_tickets[ticket_id]
+            else:
+                future = concurrent.futures.Future()
+                in_flight_tickets[ticket_id] = future
+                own_futures[ticket_id] = future
+
+    resolved = {}
+
+    try:
+        if own_futures:
+            resolved = resolve_jira_tickets(list(own_futures.keys()))
+    finally:
+        # waiters must be released even when the resolve failed
+        with in_flight_tickets_lock:
+            for ticket_id, future in own_futures.items():
+                del in_flight_tickets[ticket_id]
+                future.set_result(
+                        resolved.get(ticket_id, JiraTicketInfo('', '')))
 
-        for future in concurrent.futures.as_completed(futures):
-            ticket_id, title = future.result()
-            logging.info(f"Future get title result: {ticket_id}, {title}")
-            ticket_id_to_title[ticket_id] = title
+    ticket_id_to_info.update(resolved)
 
-    return ticket_id_to_title
+    for ticket_id, future in awaited_futures.items():
+        ticket_id_to_info[ticket_id] = future.result()
 
+    return ticket_id_to_info
 
-def extract_jira_ticket_numbers(commit_messages):
-    ticket_pattern = r'[A-Z]+-\d+'
-    ticket_ids = set(re.findall(ticket_pattern, ' '.join(commit_messages)))
 
-    return sorted(set(
-            filter(lambda ticket_id: 'LITE-000' not in ticket_id, ticket_ids)))
+def update_jira_ticket(ticket_id, title, status):
+    """
+    Store a ticket pushed by a Jira webhook, no request is needed.
+    """
+    ticket_cache.put(ticket_id, (title, status))
+    ticket_cache.save()
@@ -3,23 +3,46 @@ import logging
 import os
 import time
 
+from async_engine import engine, GITHUB_SERVICE, GIT_SERVICE
+from board_config import default_board_config, load_boards_config, \
+    shard_board_config
+from board_frame_swap import board_bounds
+from commit_analyzer import analyze_commit_messages, extract_ticket_ids, \
+    truncate_line
+from board_layout import RepoRow, plan_board_layout, REGION_MARGIN
+from board_summary import summarize_branch_pair, summarize_pr_infos
+from compare_cache import CompareCache
 from config import (
-    REPOS,
-    BRANCHES,
-    REPO_PADDING,
-    SHAPE_COLOR_NO_TICKETS,
-    SHAPE_COLOR_TICKETS,
-    SHAPES_X_PADDING,
     JIRA_BROWSE_URL,
     GITHUB_OWNER,
-    TRUNCATE_LINE_LENGTH, SHAPE_MAX_HEIGHT,
+    GITHUB_BACKEND,
+    BOARDS_CONFIG_FILE,
+    BOARD_RENDER_WORKERS,
+    SHARD_INDEX,
+    SHARD_COUNT,
+    METRICS_PORT,
+    WEBHOOK_PORT,
+    REPO_CHANGE_DETECTION,
+    REPO_POLL_MAX_SECONDS,
+    SHAPE_MAX_HEIGHT,
+    COMPARE_CACHE_MAX_MB,
+    COMPARE_CACHE_DIR,
+    COMPARE_CACHE_DIR_MAX_MB,
 )
-from git_utils import get_commit_messages, get_pull_requests_to_branch, \
-    PullRequestInfo
-from jira_utils import extract_jira_ticket_numbers, \
-    get_jira_tickets_titles
-from miro_utils import miro_create_shape, \
-    miro_cleanup_board, miro_create_connectors
+from git_graphql_utils import get_branch_pairs_commit_messages, \
+    get_repos_branches_heads, get_repos_pull_requests_to_branch
+from git_mirror_utils import iter_mirror_commit_messages, \
+    get_mirrors_branches_heads, update_mirrors, GitCommandError
+from git_utils import iter_commit_messages, get_pull_requests_to_branch, \
+    GitHubApiError, PullRequestInfo, github_session, github_response_cache
+from http_utils import get_pool_stats
+from jira_utils import get_jira_tickets_infos, ticket_cache
+from metrics import CYCLE_SECONDS, LAST_SUCCESS_TIMESTAMP, phase, \
+    register_cache, start_metrics_server
+from miro_utils import miro_session, MiroApiError
+from render_backends import create_render_backend
+from repo_change_detector import RepoChangeDetector
+from webhook_listener import start_webhook_listener
 
 os.environ["TZ"] = "UTC"
 
@@ -33,71 +56,69 @@ logger = logging.getLogger(__name__)
 
 VERSION_FILE = './version.txt'
 
+RETRY_FAILED_CYCLE_SECONDS = 60
+
 version = '0.0.0'
 
+compare_cache = CompareCache(
+        COMPARE_CACHE_MAX_MB * 1024 * 1024,
+        cache_dir=COMPARE_CACHE_DIR,
+        max_dir_bytes=COMPARE_CACHE_DIR_MAX_MB * 1024 * 1024) \
+    if COMPARE_CACHE_MAX_MB > 0 else None
+
+render_backend = create_render_backend()
+
 if os.path.isfile(VERSION_FILE):
     with open(VERSION_FILE, 'r') as f:
         version = f.read()
         version = version.strip()
 
 
-def no_ticket_ids_in_commit_message(commit_message, ticket_ids):
-    for ticket_id in ticket_ids:
-        if ticket_id in commit_message:
-            return False
-    return True
-
-
-def truncate_line(line):
-    return line[:TRUNCATE_LINE_LENGTH] + (line[TRUNCATE_LINE_LENGTH:] and '...')
-
-
-def filter_commit_messages_without_ticket_ids(commit_messages, ticket_ids):
-    return list(
-            map(lambda iter_line: truncate_line(iter_line),
-                filter(lambda commit_message:
-                       no_ticket_ids_in_commit_message(
-                               commit_message,
-                               ticket_ids),
-                       commit_messages)))
-
-
-def get_all_branches_ticket_ids(repo, branches):
-    all_ticket_ids_and_commit_msgs = []
-
-    for i, branch in enumerate(branches[:-1]):
-        commit_messages = get_commit_messages(repo, branch, branches[i + 1])
-        ticket_ids = extract_jira_ticket_numbers(commit_messages)
-        commit_msgs_without_ticket_ids = \
-            filter_commit_messages_without_ticket_ids(
-                    commit_messages, ticket_ids)
-        all_ticket_ids_and_commit_msgs.append(
-                (ticket_ids, commit_msgs_without_ticket_ids))
-
-    return repo, all_ticket_ids_and_commit_msgs
-
-
-def get_pull_requests_to_branch_per_repo(repo, branch):
-    return repo, get_pull_requests_to_branch(repo, branch)
-
-
-def create_miro_shape_with_tickets(
+def get_branch_pair_ticket_ids(repo, base_branch, compare_branch):
+    """
+    :return: ticket ids, commit messages and their authors, None when
+             the compare failed
+    """
+    try:
+        return analyze_commit_messages(
+                iter_commit_messages(repo, base_branch, compare_branch))
+    except GitHubApiError as e:
+        logger.warning(str(e))
+        return None
+
+
+def get_mirror_branch_pair_ticket_ids(repo, base_branch, compare_branch):
+    """
+    :return: ticket ids, commit messages and their authors, None when
+             the compare failed
+    """
+    try:
+        return analyze_commit_messages(
+                iter_mirror_commit_messages(repo, base_branch,
+                                            compare_branch))
+    except GitCommandError as e:
+        logger.warning(f"Failed to get commit messages, "
+                       f"repo: {repo}, {compare_branch}..{base_branch}, {e}")
+        return None
+
+
+def build_shape_text_with_tickets(
+        ticket_id_to_info,
         ticket_ids,
         commit_messages,
-        x, y,
-        from_branch, to_branch,
-        shape_color):
+        from_branch, to_branch):
     shape_text = f"<b>{from_branch} &rarr; {to_branch}</b>\n"
 
-    ticket_id_to_title = get_jira_tickets_titles(ticket_ids)
-
     ticket_texts = []
     for ticket_id in ticket_ids:
         ticket_url = JIRA_BROWSE_URL + f"/{ticket_id}"
-        ticket_title = truncate_line(ticket_id_to_title[ticket_id])
+        ticket_info = ticket_id_to_info[ticket_id]
+        ticket_title = truncate_line(ticket_info.title)
+        ticket_status = f" [{ticket_info.status}]" if ticket_info.status \
+            else ""
         ticket_texts.append(
                 f"<br/><a href=\"{ticket_url}\" target=\"blank\">"
-                f"{ticket_id}</a> - {ticket_title}")
+                f"{ticket_id}</a>{ticket_status} - {ticket_title}")
 
     for commit_message in commit_messages:
         ticket_texts.append(
@@ -108,9 +129,7 @@ def create_miro_shape_with_tickets(
 
     shape_text += "\n".join(ticket_texts)
 
-    shape = miro_create_shape(x, y, shape_text, color=shape_color)
-
-    return shape
+    return shape_text
 
 
 def build_tickets_links_html(ticket_ids):
@@ -127,18 +146,16 @@ def build_tickets_links_html(ticket_ids):
     return ", ".join(ticket_texts)
 
 
-def create_miro_shape_for_prs(
-        pr_infos,
-        x, y,
-        to_branch,
-        shape_color):
+def build_shape_text_for_prs(pr_infos, to_branch):
     shape_text = f"<b>Pull Requests &rarr; {to_branch}</b>\n"
 
+    pr_infos, more_line = summarize_pr_infos(pr_infos)
+
     pr_texts = []
     for pr_info in pr_infos:
         assert isinstance(pr_info, PullRequestInfo)
 
-        ticket_ids = extract_jira_ticket_numbers([pr_info.title])
+        ticket_ids = extract_ticket_ids(pr_info.title)
 
         tickets_html = build_tickets_links_html(ticket_ids)
 
@@ -149,70 +166,32 @@ def create_miro_shape_for_prs(
                 f"{pr_info.title}</a> - "
                 f"{pr_info.author}")
 
+    if more_line:
+        pr_texts.append(f"<br/>{more_line}")
+
     if len(pr_texts) > 0:
         shape_text += "<br/>\n"
 
     shape_text += "\n".join(pr_texts)
 
-    shape = miro_create_shape(x, y, shape_text, color=shape_color)
+    return shape_text
 
-    return shape
 
-
-def create_branch_shapes(
+def add_branch_cells(
+        row,
         branches,
         all_ticket_ids_and_commit_msgs,
-        x_offset,
-        y_offset,
-        connectors,
-        shape_color):
-    first_branch_shape = None
-    previous_shape = None
-
-    max_shape_height = 0
-
+        ticket_id_to_info):
     for i, branch in enumerate(branches[:-1]):
         logger.info(f"Processing branch: {branch} to {branches[i + 1]}")
 
         ticket_ids, commit_msgs = all_ticket_ids_and_commit_msgs[i]
 
-        has_commit_msgs = len(commit_msgs) > 0
-        commit_msgs = list(
-                filter(lambda msg: 'pull request #' not in msg, commit_msgs))
-
-        if len(commit_msgs) == 0 and has_commit_msgs:
-            commit_msgs = ['...']
-
-        ticket_shape = create_miro_shape_with_tickets(
-                ticket_ids, commit_msgs,
-                x_offset, y_offset, branch,
-                branches[i + 1],
-                shape_color)
-
-        if ticket_shape is None:
-            ticket_shape = create_miro_shape_with_tickets(
-                    ticket_ids, ['...'],
-                    x_offset, y_offset, branch,
-                    branches[i + 1],
-                    shape_color)
-
-        if ticket_shape is None:
-            continue
-
-        if i == 0:
-            first_branch_shape = ticket_shape
-        if previous_shape is not None:
-            connectors.append((previous_shape['id'], ticket_shape['id']))
-        previous_shape = ticket_shape
-
-        shape_width = ticket_shape['geometry']['width']
-        shape_height = ticket_shape['geometry']['height']
-
-        max_shape_height = max(shape_height, max_shape_height)
-
-        x_offset += shape_width + SHAPES_X_PADDING
-
-    return first_branch_shape, max_shape_height
+        row.add_cell(f"branch:{row.repo}:{branch}:{branches[i + 1]}",
+                     build_shape_text_with_tickets(
+                             ticket_id_to_info,
+                             ticket_ids, commit_msgs,
+                             branch, branches[i + 1]))
 
 
 def calculate_max_shape_height_offset(all_ticket_ids_and_commit_msgs):
@@ -228,75 +207,274 @@ def calculate_max_shape_height_offset(all_ticket_ids_and_commit_msgs):
 
 
 def calculate_max_shape_height_offset_per_pr_infos(pr_repos):
+    pr_repos, _ = summarize_pr_infos(pr_repos)
+
     offset = len(pr_repos) * 5
 
     return min(SHAPE_MAX_HEIGHT / 3, offset)
 
 
-def get_repos_to_all_branches_ticket_ids(repos, branches):
-    repo_to_all_ticket_ids = {}
+def get_branch_pairs_ticket_ids(repo_branch_pairs):
+    """
+    :param repo_branch_pairs: list of repo, base branch, compare branch
+    :return: list of ticket ids, commit messages and their authors, in the
+             order of the pairs, None for the failed compares
+    """
+    if GITHUB_BACKEND == 'graphql':
+        return [analyze_commit_messages(commit_messages)
+                if commit_messages is not None else None
+                for commit_messages in
+                get_branch_pairs_commit_messages(repo_branch_pairs)]
+
+    if GITHUB_BACKEND == 'mirror':
+        return engine.map(GIT_SERVICE, get_mirror_branch_pair_ticket_ids,
+                          *zip(*repo_branch_pairs))
+
+    return engine.map(GITHUB_SERVICE, get_branch_pair_ticket_ids,
+                      *zip(*repo_branch_pairs))
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
 
-        futures = []
+def get_cached_branch_pairs_ticket_ids(repos, branches, repo_branch_pairs):
+    """
+    Only the branch pairs whose head commits are not cached yet are
+    compared, the others are taken from the compare cache.
 
-        for repo in repos:
-            futures.append(executor.submit(get_all_branches_ticket_ids,
-                                           repo=repo,
-                                           branches=branches))
+    A push landing between reading the heads and the compare ends up with
+    newer commits cached under the older heads, the heads are read again
+    on the next cycle and do not match that entry anymore.
 
-        for future in concurrent.futures.as_completed(futures):
-            repo, all_ticket_ids_and_commit_msgs = future.result()
-            logging.info(f"Future get branches ticket IDs: "
-                         f"{repo}, {all_ticket_ids_and_commit_msgs}")
-            repo_to_all_ticket_ids[repo] = all_ticket_ids_and_commit_msgs
+    :return: list of ticket ids, commit messages and their authors, in the
+             order of the pairs, None for the failed compares
+    """
+    if GITHUB_BACKEND == 'mirror':
+        repo_to_heads = get_mirrors_branches_heads(repos, branches)
+    else:
+        repo_to_heads = get_repos_branches_heads(repos, branches)
 
-    return repo_to_all_ticket_ids
+    results = [None] * len(repo_branch_pairs)
+    missing_indexes = []
+    cache_keys = {}
+
+    for i, (repo, base_branch, compare_branch) in \
+            enumerate(repo_branch_pairs):
+        heads = repo_to_heads.get(repo) or {}
+        base_sha = heads.get(base_branch)
+        compare_sha = heads.get(compare_branch)
+
+        if base_sha and compare_sha:
+            cache_keys[i] = CompareCache.cache_key(repo, base_sha,
+                                                   compare_sha)
+            results[i] = compare_cache.get(cache_keys[i])
+
+        if results[i] is None:
+            missing_indexes.append(i)
+
+    logging.info(f"Branch pairs cached: "
+                 f"{len(repo_branch_pairs) - len(missing_indexes)}, "
+                 f"to compare: {len(missing_indexes)}")
+
+    if not missing_indexes:
+        return results
+
+    missing_results = get_branch_pairs_ticket_ids(
+            [repo_branch_pairs[i] for i in missing_indexes])
+
+    for i, result in zip(missing_indexes, missing_results):
+        results[i] = result
+
+        # only the complete compares are cached, a failed one is compared
+        # again on the next cycle, without both heads there is no key
+        if result is not None and i in cache_keys:
+            compare_cache.put(cache_keys[i], *result)
+
+    return results
+
+
+def unique(values):
+    return list(dict.fromkeys(values))
+
+
+def get_repo_branch_pairs_ticket_ids(repo_branch_pairs):
+    """
+    :param repo_branch_pairs: list of repo, base branch, compare branch
+    :return: repo branch pair to ticket ids, commit messages and their
+             authors, the failed compares are left out
+    """
+    repos = unique(repo for repo, _, _ in repo_branch_pairs)
+
+    if GITHUB_BACKEND == 'mirror':
+        update_mirrors(repos)
+
+    if compare_cache is not None:
+        branches = unique(branch for _, base_branch, compare_branch in
+                          repo_branch_pairs
+                          for branch in (base_branch, compare_branch))
+
+        results = get_cached_branch_pairs_ticket_ids(repos, branches,
+                                                     repo_branch_pairs)
+    else:
+        results = get_branch_pairs_ticket_ids(repo_branch_pairs)
+
+    for (repo, base_branch, compare_branch), ticket_ids_and_commit_msgs in \
+            zip(repo_branch_pairs, results):
+        logging.info(f"Get branches ticket IDs: "
+                     f"{repo}, {base_branch}, {compare_branch}, "
+                     f"{ticket_ids_and_commit_msgs}")
+
+    return {pair: result for pair, result in zip(repo_branch_pairs, results)
+            if result is not None}
 
 
 def get_repos_pull_requests(repos, branch):
+    if GITHUB_BACKEND == 'graphql':
+        return get_repos_pull_requests_to_branch(repos, branch)
+
+    results = engine.map(GITHUB_SERVICE, get_pull_requests_to_branch,
+                         repos, [branch] * len(repos))
+
     repo_to_pr_infos = {}
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    for repo, pr_infos in zip(repos, results):
+        logging.info(f"Get branch pull requests: {repo}, {pr_infos}")
+        repo_to_pr_infos[repo] = pr_infos
 
-        futures = []
+    return repo_to_pr_infos
 
-        for repo in repos:
-            futures.append(executor.submit(get_pull_requests_to_branch_per_repo,
-                                           repo=repo,
-                                           branch=branch))
 
-        for future in concurrent.futures.as_completed(futures):
-            repo, pr_infos = future.result()
-            logging.info(f"Future get branch pull requests: "
-                         f"{repo}, {pr_infos}")
-            repo_to_pr_infos[repo] = pr_infos
+class BoardData:
+    """
+    Everything fetched from GitHub for the boards, shared by all the boards
+    and kept between the renders so a webhook only refetches the changed
+    repos. A branch pair whose compare failed keeps its last fetched
+    result.
+    """
+
+    def __init__(self, pair_to_ticket_ids, repo_branch_to_pr_infos,
+                 failed_repos=()):
+        """
+        :param pair_to_ticket_ids: repo, base branch, compare branch to
+                                   the shown ticket ids and commit messages
+        :param repo_branch_to_pr_infos: repo, branch to the open pull
+                                        requests to that branch
+        :param failed_repos: repos with a failed compare in this fetch,
+                             e.g. a timeout, a missing branch is an empty
+                             compare
+        """
+        self.pair_to_ticket_ids = pair_to_ticket_ids
+        self.repo_branch_to_pr_infos = repo_branch_to_pr_infos
+        self.failed_repos = set(failed_repos)
 
-    return repo_to_pr_infos
+    def update(self, board_data):
+        self.pair_to_ticket_ids.update(board_data.pair_to_ticket_ids)
+        self.repo_branch_to_pr_infos.update(
+                board_data.repo_branch_to_pr_infos)
+
+    def all_ticket_ids_and_commit_msgs(self, repo, branches):
+        return [self.pair_to_ticket_ids.get(
+                        (repo, branches[i], branches[i + 1]), ([], []))
+                for i in range(len(branches) - 1)]
+
+    def pr_infos(self, repo, branch):
+        return self.repo_branch_to_pr_infos.get((repo, branch), [])
+
+    def ticket_ids(self, board):
+        ticket_ids = set()
+
+        for repo in board.repos:
+            for branch_ticket_ids, _ in \
+                    self.all_ticket_ids_and_commit_msgs(repo,
+                                                        board.branches):
+                ticket_ids.update(branch_ticket_ids)
+
+            pr_infos, _ = summarize_pr_infos(
+                    self.pr_infos(repo, board.branches[0]))
+
+            for pr_info in pr_infos:
+                ticket_ids.update(extract_ticket_ids(pr_info.title))
+
+        return ticket_ids
+
+
+def fetch_board_data(boards, repos=None):
+    """
+    Fetch what the boards show, a repo or a branch pair shown on many
+    boards is fetched once.
+
+    :param boards:
+    :param repos: only these repos of the boards, all when None
+    :return: BoardData
+    """
+    repo_branch_pairs = unique(pair for board in boards
+                               for pair in board.repo_branch_pairs(repos))
+
+    branch_to_repos = {}
+    for board in boards:
+        branch_to_repos.setdefault(board.branches[0], []).extend(
+                repo for repo in board.repos
+                if repos is None or repo in repos)
+
+    logger.info(f"Fetch boards: {len(boards)}, "
+                f"branch pairs: {len(repo_branch_pairs)}")
+
+    with phase('github_fetch'):
+        pair_to_ticket_ids = get_repo_branch_pairs_ticket_ids(
+                repo_branch_pairs)
 
+        failed_repos = set(pair[0] for pair in repo_branch_pairs
+                           if pair not in pair_to_ticket_ids)
 
-def create_miro_board_for_repos(repos, branches):
-    y_offset = 0
-    connectors = []
+        # only the shown tickets are resolved in Jira
+        pair_to_ticket_ids = {
+            pair: summarize_branch_pair(ticket_ids, commit_msgs, authors)
+            for pair, (ticket_ids, commit_msgs, authors) in
+            pair_to_ticket_ids.items()}
 
-    repo_to_all_ticket_ids = get_repos_to_all_branches_ticket_ids(repos,
-                                                                  branches)
+        repo_branch_to_pr_infos = {}
+
+        for branch, branch_repos in branch_to_repos.items():
+            for repo, pr_infos in get_repos_pull_requests(
+                    unique(branch_repos), branch).items():
+                repo_branch_to_pr_infos[(repo, branch)] = pr_infos
+
+    return BoardData(pair_to_ticket_ids, repo_branch_to_pr_infos,
+                     failed_repos)
+
+
+def prefetch_tickets_infos(boards, board_data):
+    """
+    Resolve the union of the tickets of all boards, repos, branch pairs and
+    pull request titles at once, before any rendering.
+    """
+    all_ticket_ids = set()
+
+    for board in boards:
+        all_ticket_ids.update(board_data.ticket_ids(board))
+
+    logger.info(f"Prefetch tickets: {len(all_ticket_ids)}")
+
+    return get_jira_tickets_infos(sorted(all_ticket_ids))
+
+
+def render_board(board, board_data, ticket_id_to_info):
+    branches = board.branches
 
     current_time = time.strftime('%Y-%m-%d %H:%M:%S %Z', time.gmtime())
 
     time_text = f"<b>{current_time}</b><br/>" \
                 f"<b>v.{version}</b>"
-    miro_create_shape(0, y_offset, time_text, color=SHAPE_COLOR_NO_TICKETS)
-    y_offset += REPO_PADDING
 
-    repo_to_pr_infos = get_repos_pull_requests(repos, branches[0])
+    if board.shard_count > 1:
+        time_text += f"<br/>shard {board.shard_index + 1}/{board.shard_count}"
 
-    for repo in repos:
+    rows = []
+
+    for repo in board.repos:
         logger.info(f"Processing repo: {repo}")
 
-        pr_infos = repo_to_pr_infos[repo]
+        pr_infos = board_data.pr_infos(repo, branches[0])
 
-        all_ticket_ids_and_commit_msgs = repo_to_all_ticket_ids[repo]
+        all_ticket_ids_and_commit_msgs = \
+            board_data.all_ticket_ids_and_commit_msgs(repo, branches)
 
         any_tickets = any(ticket_ids or commit_msgs for
                           (ticket_ids, commit_msgs) in
@@ -304,54 +482,266 @@ def create_miro_board_for_repos(repos, branches):
 
         any_tickets = any_tickets or any(pr_infos)
 
-        y_offset += max(
+        top_offset = max(
                 calculate_max_shape_height_offset_per_pr_infos(pr_infos),
                 calculate_max_shape_height_offset(
                         all_ticket_ids_and_commit_msgs))
 
-        shape_color = SHAPE_COLOR_NO_TICKETS if not any_tickets \
-            else SHAPE_COLOR_TICKETS
+        shape_color = board.shape_color_no_tickets if not any_tickets \
+            else board.shape_color_tickets
+
+        row = RepoRow(repo, shape_color, top_offset)
 
         repo_text = f"<a href=\"https://github.com/{GITHUB_OWNER}/{repo}\" " \
                     f"target=\"blank\">{repo}</a></b>"
+        row.add_cell(f"repo:{repo}", repo_text)
 
-        repo_shape = miro_create_shape(0, y_offset, repo_text,
-                                       color=shape_color)
+        row.add_cell(f"prs:{repo}:{branches[0]}",
+                     build_shape_text_for_prs(pr_infos, branches[0]))
 
-        repo_shape_width = repo_shape['geometry']['width']
-        x_offset = repo_shape_width + SHAPES_X_PADDING
+        add_branch_cells(row, branches, all_ticket_ids_and_commit_msgs,
+                         ticket_id_to_info)
 
-        pr_shape = create_miro_shape_for_prs(pr_infos, x_offset, y_offset,
-                                             branches[0], shape_color)
+        rows.append(row)
 
-        pr_shape_width = pr_shape['geometry']['width']
-        pr_shape_height = pr_shape['geometry']['height']
-        x_offset += pr_shape_width + SHAPES_X_PADDING
+    x_origin = board.region.left + REGION_MARGIN \
+        if board.region is not None else 0
 
-        connectors.append((repo_shape['id'], pr_shape['id']))
+    with phase('layout'):
+        desired_board = plan_board_layout(time_text,
+                                          board.shape_color_no_tickets, rows,
+                                          x_origin=x_origin)
 
-        first_branch_shape, max_shape_height = \
-            create_branch_shapes(branches, all_ticket_ids_and_commit_msgs,
-                                 x_offset, y_offset,
-                                 connectors,
-                                 shape_color)
+    if board.region is not None:
+        _, _, max_x, _ = board_bounds(desired_board)
 
-        if first_branch_shape is not None:
-            connectors.append((pr_shape['id'], first_branch_shape['id']))
+        if max_x > board.region.left + board.region.width:
+            logger.warning(f"Shard {board.shard_index} is wider than its "
+                           f"region, increase SHARD_REGION_WIDTH to at "
+                           f"least {max_x - board.region.left:.0f}")
 
-        y_offset += max(max_shape_height, pr_shape_height) / 2 + REPO_PADDING
+    render_backend.render(board, desired_board)
 
-    miro_create_connectors(connectors)
 
+def render_boards(boards, board_data):
+    """
+    Render the boards concurrently on a pool of BOARD_RENDER_WORKERS, a
+    board that fails does not stop the others.
+    """
+    with phase('jira_resolve'):
+        ticket_id_to_info = prefetch_tickets_infos(boards, board_data)
+
+    if len(boards) == 1:
+        render_board(boards[0], board_data, ticket_id_to_info)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(BOARD_RENDER_WORKERS, len(boards)),
+            thread_name_prefix='board') as executor:
+        futures = [executor.submit(render_board, board, board_data,
+                                   ticket_id_to_info)
+                   for board in boards]
+
+    errors = []
+
+    for board, future in zip(boards, futures):
+        try:
+            future.result()
+        except MiroApiError as e:
+            logger.error(f"Failed to render board {board.board_id}: {e}")
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+
+def boards_repos(boards):
+    return unique(repo for board in boards for repo in board.repos)
+
+
+def boards_branches(boards):
+    return unique(branch for board in boards for branch in board.branches)
+
+
+def create_miro_boards(boards, board_data=None, change_detector=None):
+    """
+    :param boards: list of BoardConfig
+    :param board_data: BoardData of the previous cycle
+    :param change_detector: RepoChangeDetector, only the changed repos of
+                            the previous cycle data are fetched again
+    :return: BoardData of this cycle
+    """
+    repos = boards_repos(boards)
+
+    changed_repos = change_detector.check(repos) \
+        if change_detector is not None else repos
+
+    failed_repos = set()
+
+    if board_data is None:
+        board_data = fetch_board_data(boards)
+        failed_repos = board_data.failed_repos
+    elif changed_repos:
+        changed_board_data = fetch_board_data(boards, set(changed_repos))
+        board_data.update(changed_board_data)
+        failed_repos = changed_board_data.failed_repos
+
+    render_boards(boards, board_data)
+
+    if change_detector is not None:
+        # the repos with a failed compare are fetched again next cycle
+        change_detector.confirm(failed_repos)
+
+    return board_data
+
+
+def refresh_miro_boards(boards, board_data, changes):
+    """
+    Render the boards again for the changes reported by the webhooks, only
+    the changed repos are fetched again and only the boards showing a
+    change are rendered. The changed tickets are already in the ticket
+    cache, the reconcile patches only the shapes whose text changed.
+    """
+    changed_boards = [
+        board for board in boards
+        if changes.repos.intersection(board.repos) or
+        changes.ticket_ids & board_data.ticket_ids(board)]
+
+    if not changed_boards:
+        logger.info("Webhook changes are not on the boards, skip render")
+        return
+
+    changed_repos = changes.repos.intersection(boards_repos(changed_boards))
+
+    logger.info(f"Refresh boards: "
+                f"{[board.board_id for board in changed_boards]}, "
+                f"repos: {sorted(changed_repos)}, "
+                f"tickets: {sorted(changes.ticket_ids)}")
+
+    if changed_repos:
+        board_data.update(fetch_board_data(changed_boards, changed_repos))
+
+    render_boards(changed_boards, board_data)
+
+
+def load_boards():
+    boards = load_boards_config(BOARDS_CONFIG_FILE) if BOARDS_CONFIG_FILE \
+        else [default_board_config()]
+
+    if SHARD_COUNT > 1:
+        boards = [shard_board_config(board, SHARD_INDEX, SHARD_COUNT)
+                  for board in boards]
+
+        logger.info(f"Shard {SHARD_INDEX} of {SHARD_COUNT}, repos: "
+                    f"{sum(len(board.repos) for board in boards)}")
+
+    return boards
+
+
+def log_http_stats():
+    logger.info(f"GitHub HTTP pool: {get_pool_stats(github_session)}")
+    logger.info(f"Miro HTTP pool: {get_pool_stats(miro_session)}")
+    logger.info(f"GitHub response cache: {github_response_cache.stats()}")
+
+    if compare_cache is not None:
+        logger.info(f"Compare cache: {compare_cache.stats()}")
+
+
+def register_caches_metrics():
+    register_cache('jira_tickets',
+                   lambda: (ticket_cache.hits, ticket_cache.misses))
+
+    register_cache('github_responses',
+                   lambda: (github_response_cache.stats()['hits'],
+                            github_response_cache.stats()['misses']))
+
+    if compare_cache is not None:
+        register_cache('compares',
+                       lambda: (compare_cache.hits, compare_cache.misses))
+
+
+def apply_webhook_changes(webhook_changes, boards, board_data,
+                          each_seconds):
+    """
+    Render the webhook changes as they come, until the next full cycle.
+
+    :param webhook_changes: ChangeDebouncer
+    :param boards:
+    :param board_data: BoardData of the last full cycle
+    :param each_seconds: full cycle period, not positive for webhooks only
+    """
+    deadline = time.monotonic() + each_seconds if each_seconds > 0 else None
 
-if __name__ == "__main__":
     while True:
-        miro_cleanup_board()
+        timeout = None if deadline is None else deadline - time.monotonic()
+
+        if timeout is not None and timeout <= 0:
+            return
+
+        changes = webhook_changes.wait(timeout)
+
+        if changes is None:
+            return
 
-        create_miro_board_for_repos(REPOS, BRANCHES)
+        try:
+            refresh_miro_boards(boards, board_data, changes)
+        except MiroApiError as e:
+            logger.error(f"Failed to refresh the boards, "
+                         f"render them all: {e}")
+            return
 
+
+if __name__ == "__main__":
+    boards = load_boards()
+
+    logger.info(f"Boards: {[board.board_id for board in boards]}")
+
+    if METRICS_PORT > 0:
+        register_caches_metrics()
+        start_metrics_server(METRICS_PORT)
+
+    webhook_changes = start_webhook_listener(
+            WEBHOOK_PORT, boards_repos(boards), boards_branches(boards)) \
+        if WEBHOOK_PORT > 0 else None
+
+    change_detector = RepoChangeDetector(
+            boards_branches(boards),
+            int(os.getenv("EXECUTE_EACH_SECONDS", 0)),
+            REPO_POLL_MAX_SECONDS,
+            unique(board.branches[0] for board in boards)) \
+        if REPO_CHANGE_DETECTION else None
+
+    board_data = None
+
+    while True:
         each_seconds = int(os.getenv("EXECUTE_EACH_SECONDS", 0))
-        if each_seconds > 0:
+
+        if webhook_changes is not None:
+            # the full cycle covers all the changes so far
+            webhook_changes.clear()
+
+        try:
+            with CYCLE_SECONDS.time():
+                board_data = create_miro_boards(
+                        boards, board_data, change_detector)
+
+            LAST_SUCCESS_TIMESTAMP.set_to_current_time()
+        except MiroApiError as e:
+            if each_seconds <= 0 and webhook_changes is None:
+                raise
+
+            logger.error(f"Failed to update the boards, "
+                         f"retry next cycle: {e}")
+
+        log_http_stats()
+
+        if webhook_changes is not None and board_data is not None:
+            apply_webhook_changes(webhook_changes, boards, board_data,
+                                  each_seconds)
+        elif each_seconds > 0:
             time.sleep(each_seconds)
-        else:
+        elif webhook_changes is None:
             break
+        else:
+            # only webhooks and the cycle failed, do not spin on the error
+            time.sleep(RETRY_FAILED_CYCLE_SECONDS)
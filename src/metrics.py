@@ -0,0 +1,105 @@
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, \
+    start_http_server
+from prometheus_client.core import CounterMetricFamily
+
+logger = logging.getLogger(__name__)
+
+CYCLE_SECONDS = Histogram(
+        'miraisor_cycle_seconds',
+        'Duration of a whole board cycle',
+        buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200))
+
+PHASE_SECONDS = Histogram(
+        'miraisor_phase_seconds',
+        'Duration of a board cycle phase',
+        ['phase'],
+        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600))
+
+REQUESTS_TOTAL = Counter(
+        'miraisor_http_requests_total',
+        'HTTP requests per service and status code',
+        ['service', 'status'])
+
+REQUEST_SECONDS = Histogram(
+        'miraisor_http_request_seconds',
+        'HTTP request latency per service and status code',
+        ['service', 'status'])
+
+RETRIES_TOTAL = Counter(
+        'miraisor_retries_total',
+        'Retried requests per service and reason',
+        ['service', 'reason'])
+
+LAST_SUCCESS_TIMESTAMP = Gauge(
+        'miraisor_last_success_timestamp_seconds',
+        'Unix time of the last successful board cycle')
+
+
+class CacheCollector:
+    """
+    Reads the hits and misses of the registered caches on every scrape,
+    the caches keep their own counters.
+    """
+
+    def __init__(self):
+        self.caches = {}
+
+    def collect(self):
+        hits = CounterMetricFamily('miraisor_cache_hits',
+                                   'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('miraisor_cache_misses',
+                                     'Cache misses', labels=['cache'])
+
+        for name, stats_func in self.caches.items():
+            cache_hits, cache_misses = stats_func()
+            hits.add_metric([name], cache_hits)
+            misses.add_metric([name], cache_misses)
+
+        yield hits
+        yield misses
+
+
+cache_collector = CacheCollector()
+
+REGISTRY.register(cache_collector)
+
+
+def register_cache(name, stats_func):
+    """
+    :param name: label of the cache
+    :param stats_func: returns the hits and misses of the cache
+    """
+    cache_collector.caches[name] = stats_func
+
+
+def instrument_session(session, service):
+    """
+    Count every response of the session and its latency.
+
+    :param session: requests.Session
+    :param service: label of the service
+    """
+
+    def observe_response(response, *args, **kwargs):
+        status = str(response.status_code)
+
+        REQUESTS_TOTAL.labels(service, status).inc()
+        REQUEST_SECONDS.labels(service, status).observe(
+                response.elapsed.total_seconds())
+
+    session.hooks['response'].append(observe_response)
+
+
+def phase(name):
+    """
+    :return: context manager timing the phase of the board cycle
+    """
+    return PHASE_SECONDS.labels(name).time()
+
+
+def start_metrics_server(port):
+    start_http_server(port)
+
+    logger.info(f"Metrics are exported on port {port}")
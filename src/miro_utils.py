@@ -1,20 +1,26 @@
-import concurrent.futures
 import http
 import logging
 import math
-import random
 import re
 import string
-import sys
 import time
 
 import requests
 
+from async_engine import engine, MIRO_SERVICE
 from config import (
     MIRO_API_URL,
     MIRO_API_TOKEN,
-    MIRO_BOARD_ID, MAX_REQUEST_RETRIES, SHAPE_MAX_HEIGHT,
+    SHAPE_MAX_HEIGHT,
+    MIRO_RATE_LIMIT_CREDITS,
+    MIRO_BACKOFF_BASE_SECONDS,
+    MIRO_BACKOFF_MAX_SECONDS,
+    MIRO_BULK_CHUNK_SIZE,
+    MIRO_CONCURRENCY,
 )
+from http_utils import MAX_REQUEST_ATTEMPTS, create_session
+from metrics import RETRIES_TOTAL, instrument_session
+from rate_limiter import RateLimiter, backoff_delay
 
 logger = logging.getLogger(__name__)
 
@@ -24,45 +30,140 @@ miro_headers = {
     "Content-Type": "application/json",
 }
 
-shapes_url = f'{MIRO_API_URL}/boards/{MIRO_BOARD_ID}/shapes'
+miro_session = create_session(miro_headers, MIRO_CONCURRENCY)
 
-connectors_url = f'{MIRO_API_URL}/boards/{MIRO_BOARD_ID}/connectors'
+instrument_session(miro_session, MIRO_SERVICE)
+
+miro_rate_limiter = RateLimiter(MIRO_RATE_LIMIT_CREDITS)
+
+
+def shapes_url(board_id):
+    return f'{MIRO_API_URL}/boards/{board_id}/shapes'
+
+
+def connectors_url(board_id):
+    return f'{MIRO_API_URL}/boards/{board_id}/connectors'
+
+
+def items_url(board_id):
+    return f'{MIRO_API_URL}/boards/{board_id}/items'
+
+
+def frames_url(board_id):
+    return f'{MIRO_API_URL}/boards/{board_id}/frames'
+
+
+def items_bulk_url(board_id):
+    return f'{MIRO_API_URL}/boards/{board_id}/items/bulk'
 
-items_url = f'{MIRO_API_URL}/boards/{MIRO_BOARD_ID}/items'
 
 html_tags = ['<b>', '</b>', '<br>', '<br/>', '</br>', '<p>', '</p>']
 
 
-def execute_requests_with_retry(lambda_func):
-    for retry in range(1, MAX_REQUEST_RETRIES):
-        response = lambda_func()
+# https://developers.miro.com/reference/ratelimiting
+MIRO_READ_CREDITS = 50
+MIRO_WRITE_CREDITS = 100
+
+
+class MiroApiError(Exception):
+    def __init__(self, message, status_code=None, response_text=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+class MiroForbiddenError(MiroApiError):
+    pass
+
+
+class MiroRetriesExhaustedError(MiroApiError):
+    pass
+
+
+def parse_int_header(response, header_name):
+    try:
+        return int(response.headers.get(header_name))
+    except (TypeError, ValueError):
+        return None
+
+
+def update_rate_limiter(response):
+    miro_rate_limiter.update_from_headers(
+            parse_int_header(response, 'X-RateLimit-Limit'),
+            parse_int_header(response, 'X-RateLimit-Remaining'),
+            parse_int_header(response, 'X-RateLimit-Reset'))
+
+
+def retry_after_seconds(response):
+    retry_after = parse_int_header(response, 'Retry-After')
+
+    if retry_after is not None:
+        return retry_after
+
+    reset_at = parse_int_header(response, 'X-RateLimit-Reset')
+
+    if reset_at is not None:
+        return max(0, reset_at - time.time())
+
+    return None
+
+
+def is_request_blocked(response):
+    return response.status_code == http.HTTPStatus.FORBIDDEN and \
+        'the request has been blocked' in response.text
+
+
+def execute_requests_with_retry(lambda_func,
+                                credits=MIRO_WRITE_CREDITS):
+    for attempt in range(1, MAX_REQUEST_ATTEMPTS + 1):
+        miro_rate_limiter.acquire(credits)
+
+        try:
+            response = lambda_func()
+        except requests.RequestException as e:
+            delay = backoff_delay(attempt,
+                                  MIRO_BACKOFF_BASE_SECONDS,
+                                  MIRO_BACKOFF_MAX_SECONDS)
 
-        if response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS:
-            time.sleep(
-                    random.randrange(1, math.ceil(1.5 * MAX_REQUEST_RETRIES)))
+            logger.warning(f"Request failed on attempt {attempt}, "
+                           f"retry in {delay:.1f}s: {e}")
+
+            RETRIES_TOTAL.labels(MIRO_SERVICE, 'connection').inc()
+
+            time.sleep(delay)
             continue
 
-        if response.status_code == http.HTTPStatus.NO_CONTENT:
-            return None
+        update_rate_limiter(response)
 
-        if response.status_code == http.HTTPStatus.FORBIDDEN:
-            if 'the request has been blocked' in response.text:
-                logger.warning(
-                        "Found 'the request has been blocked' "
-                        "in response, sleep a bit...")
+        if response.status_code == http.HTTPStatus.TOO_MANY_REQUESTS or \
+                is_request_blocked(response):
+            delay = backoff_delay(attempt,
+                                  MIRO_BACKOFF_BASE_SECONDS,
+                                  MIRO_BACKOFF_MAX_SECONDS,
+                                  retry_after_seconds(response))
+
+            logger.warning(f"Rate limited on attempt {attempt}, "
+                           f"status code: {response.status_code}, "
+                           f"pause all requests for {delay:.1f}s, "
+                           f"Response: {response.text}")
 
-                logger.warning(f"Response: {response.text}")
+            RETRIES_TOTAL.labels(
+                    MIRO_SERVICE,
+                    'blocked' if is_request_blocked(response)
+                    else 'rate_limited').inc()
+
+            # pause all the workers, not only this one, to avoid a
+            # thundering herd of retries
+            miro_rate_limiter.pause(delay)
+            continue
 
-                time.sleep(
-                        random.randrange(1,
-                                         math.ceil(1.5 * MAX_REQUEST_RETRIES)))
+        if response.status_code == http.HTTPStatus.NO_CONTENT:
+            return None
 
-                continue
-            else:
-                logger.fatal(
-                        f"Got forbidden "
-                        f"{response.status_code}, {response.text}")
-                sys.exit(1)
+        if response.status_code == http.HTTPStatus.FORBIDDEN:
+            raise MiroForbiddenError(
+                    f"Got forbidden {response.status_code}, {response.text}",
+                    response.status_code, response.text)
 
         if response.status_code == http.HTTPStatus.OK or \
                 response.status_code == http.HTTPStatus.CREATED:
@@ -70,18 +171,20 @@ def execute_requests_with_retry(lambda_func):
                 return response.json()
             except Exception as e:
                 logger.exception(
-                        f"On retry {retry} Failed to parse response: "
+                        f"On attempt {attempt} Failed to parse response: "
                         f"{response.status_code}, {response.text}, {e}")
-                time.sleep(random.randrange(2, 20))
+                RETRIES_TOTAL.labels(MIRO_SERVICE, 'invalid_response').inc()
+                time.sleep(backoff_delay(attempt,
+                                         MIRO_BACKOFF_BASE_SECONDS,
+                                         MIRO_BACKOFF_MAX_SECONDS))
         else:
-            logger.fatal(
+            raise MiroApiError(
                     f"Got unexpected status code {response.status_code}, "
-                    f"{response.text}")
-            sys.exit(2)
+                    f"{response.text}",
+                    response.status_code, response.text)
 
-    logger.fatal(
-            f"Failed to execute request after {MAX_REQUEST_RETRIES} retries")
-    sys.exit(3)
+    raise MiroRetriesExhaustedError(
+            f"Failed to execute request after {MAX_REQUEST_ATTEMPTS} attempts")
 
 
 def normalize_line_len(line):
@@ -124,12 +227,7 @@ def remove_non_ascii(a_str):
     )
 
 
-total_max_send = 0
-
-
-def miro_create_shape(x, y, text, color=None):
-    global total_max_send
-
+def build_shape_payload(x, y, text, color=None):
     """
     Check https://developers.miro.com/reference/create-shape-item
 
@@ -176,18 +274,99 @@ def miro_create_shape(x, y, text, color=None):
         shape_payload['style']['fillColor'] = color
         shape_payload['style']['fillOpacity'] = '1.0'
 
-    logger.debug(f"Creating shape ${shapes_url}: ${shape_payload}")
+    return shape_payload
+
+
+def miro_post_shape(board_id, shape_payload):
+    logger.debug(f"Creating shape {board_id}: {shape_payload}")
+
+    return execute_requests_with_retry(
+            lambda: miro_session.post(shapes_url(board_id),
+                                      json=shape_payload))
+
+
+def miro_post_shapes_chunk(board_id, shape_payloads):
+    """
+    Create all the shapes of the chunk with a single call, if the chunk
+    fails each shape is created with its own call.
+
+    Check https://developers.miro.com/reference/create-items-in-bulk
+
+    :param board_id:
+    :param shape_payloads: at most MIRO_BULK_CHUNK_SIZE payloads
+    :return: the created shapes in the order of the payloads
+    """
+    bulk_payload = [dict(shape_payload, type="shape")
+                    for shape_payload in shape_payloads]
+
+    try:
+        result = execute_requests_with_retry(
+                lambda: miro_session.post(items_bulk_url(board_id),
+                                          json=bulk_payload))
+    except MiroApiError as e:
+        logger.warning(f"Failed to bulk create {len(shape_payloads)} shapes, "
+                       f"fallback to single creates: {e}")
+        result = None
+
+    shapes = (result or {}).get('data') or []
+
+    if len(shapes) == len(shape_payloads):
+        return shapes
+
+    if result is not None:
+        logger.warning(f"Bulk create returned {len(shapes)} shapes "
+                       f"of {len(shape_payloads)}, "
+                       f"fallback to single creates")
+
+    return [miro_post_shape(board_id, shape_payload)
+            for shape_payload in shape_payloads]
+
+
+def miro_post_shapes(board_id, shape_payloads):
+    """
+    Create the shapes in chunks through the bulk endpoint, the chunks are
+    sent concurrently.
+
+    :param board_id:
+    :param shape_payloads:
+    :return: the created shapes in the order of the payloads
+    """
+    shape_payloads = list(shape_payloads)
+
+    chunks = [shape_payloads[chunk_start:chunk_start + MIRO_BULK_CHUNK_SIZE]
+              for chunk_start in range(0, len(shape_payloads),
+                                       MIRO_BULK_CHUNK_SIZE)]
+
+    chunks_shapes = engine.map(MIRO_SERVICE, miro_post_shapes_chunk,
+                               [board_id] * len(chunks), chunks)
+
+    logger.info(f"Created shapes: {len(shape_payloads)} "
+                f"in {len(chunks)} bulk calls")
+
+    return [shape for chunk_shapes in chunks_shapes for shape in chunk_shapes]
+
+
+def miro_update_shape(board_id, shape_id, shape_payload):
+    """
+    Check https://developers.miro.com/reference/update-shape-item
+
+    :param board_id:
+    :param shape_id:
+    :param shape_payload:
+    :return:
+    """
+    logger.debug(f"Updating shape {shape_id}: {shape_payload}")
 
     return execute_requests_with_retry(
-            lambda: requests.post(shapes_url,
-                                  json=shape_payload,
-                                  headers=miro_headers))
+            lambda: miro_session.patch(shapes_url(board_id) + f"/{shape_id}",
+                                       json=shape_payload))
 
 
-def miro_create_connector(start_shape_id, end_shape_id):
+def miro_create_connector(board_id, start_shape_id, end_shape_id):
     """
     Check https://developers.miro.com/reference/create-connector
 
+    :param board_id:
     :param start_shape_id:
     :param end_shape_id:
     :return:
@@ -199,64 +378,162 @@ def miro_create_connector(start_shape_id, end_shape_id):
     }
 
     return execute_requests_with_retry(
-            lambda: requests.post(connectors_url,
-                                  json=connector_payload, headers=miro_headers))
+            lambda: miro_session.post(connectors_url(board_id),
+                                      json=connector_payload))
+
+
+def miro_create_connectors(board_id, connectors):
+    connectors = list(connectors)
+
+    results = engine.map(MIRO_SERVICE, miro_create_connector,
+                         [board_id] * len(connectors),
+                         [start_shape_id for start_shape_id, _ in connectors],
+                         [end_shape_id for _, end_shape_id in connectors])
 
+    logging.info(f"Created connectors: {len(results)}")
 
-def miro_create_connectors(connectors):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    return results
 
-        futures = []
 
-        for (start_shape_id, end_shape_id) in connectors:
-            futures.append(executor.submit(miro_create_connector,
-                                           start_shape_id=start_shape_id,
-                                           end_shape_id=end_shape_id))
+def miro_delete_connector(board_id, connector_id):
+    logging.info(f"Delete connector: {connector_id}")
 
-        for future in concurrent.futures.as_completed(futures):
-            logging.info(f"Future create connectors result: {future.result()}")
+    execute_requests_with_retry(
+            lambda: miro_session.delete(
+                    connectors_url(board_id) + f"/{connector_id}"))
+
+
+def miro_delete_connectors(board_id, connector_ids):
+    connector_ids = list(connector_ids)
+
+    engine.map(MIRO_SERVICE, miro_delete_connector,
+               [board_id] * len(connector_ids), connector_ids)
 
 
-def miro_delete_shape(shape_id):
+def miro_delete_shape(board_id, shape_id):
     logging.info(f"Delete shape: {shape_id}")
 
     execute_requests_with_retry(
-            lambda: requests.delete(shapes_url + f"/{shape_id}",
-                                    headers=miro_headers))
+            lambda: miro_session.delete(
+                    shapes_url(board_id) + f"/{shape_id}"))
 
 
-def miro_delete_shapes(shape_ids):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+def miro_delete_shapes(board_id, shape_ids):
+    shape_ids = list(shape_ids)
 
-        futures = []
+    engine.map(MIRO_SERVICE, miro_delete_shape,
+               [board_id] * len(shape_ids), shape_ids)
 
-        for shape_id in shape_ids:
-            futures.append(
-                    executor.submit(miro_delete_shape, shape_id=shape_id))
 
-        for future in concurrent.futures.as_completed(futures):
-            logging.info(f"Future delete result: {future.result()}")
+def miro_create_frame(board_id, x, y, width, height, title):
+    """
+    Check https://developers.miro.com/reference/create-frame-item
+
+    :param board_id:
+    :param x: center of the frame
+    :param y: center of the frame
+    :param width:
+    :param height:
+    :param title:
+    :return:
+    """
+    frame_payload = {
+        "data": {
+            "format": "custom",
+            "title": title,
+            "type": "freeform",
+        },
+        "position": {
+            "origin": "center",
+            "x": math.ceil(x),
+            "y": math.ceil(y),
+        },
+        "geometry": {
+            "height": math.ceil(height),
+            "width": math.ceil(width),
+        },
+        "style": {
+            "fillColor": "#ffffff",
+        }
+    }
+
+    return execute_requests_with_retry(
+            lambda: miro_session.post(frames_url(board_id),
+                                      json=frame_payload))
+
+
+def miro_move_frame(board_id, frame_id, x, y):
+    """
+    Move the frame with all its children in a single call.
+
+    Check https://developers.miro.com/reference/update-frame-item
+    """
+    position_payload = {
+        "position": {
+            "origin": "center",
+            "x": math.ceil(x),
+            "y": math.ceil(y),
+        }
+    }
+
+    return execute_requests_with_retry(
+            lambda: miro_session.patch(frames_url(board_id) + f"/{frame_id}",
+                                       json=position_payload))
+
 
+def miro_delete_frame(board_id, frame_id):
+    logging.info(f"Delete frame: {frame_id}")
+
+    execute_requests_with_retry(
+            lambda: miro_session.delete(
+                    frames_url(board_id) + f"/{frame_id}"))
+
+
+def miro_get_frame_children(board_id, frame_id):
+    return miro_get_all_items(items_url(board_id), parent_item_id=frame_id)
+
+
+def miro_get_all_items(items_list_url, item_type=None, parent_item_id=None):
+    items = []
 
-def miro_cleanup_board():
     iter_cursor = ""
     while True:
         params = {
             "limit": 50,
-            "type": "shape",
             "cursor": iter_cursor
         }
 
-        items = execute_requests_with_retry(
-                lambda: requests.get(items_url, params, headers=miro_headers))
+        if item_type:
+            params["type"] = item_type
+
+        if parent_item_id:
+            params["parent_item_id"] = parent_item_id
+
+        page = execute_requests_with_retry(
+                lambda: miro_session.get(items_list_url,
+                                         params=params),
+                credits=MIRO_READ_CREDITS)
 
-        if 'data' in items and len(items['data']) > 0:
-            shape_ids = list(map(lambda shape: shape['id'], items['data']))
-            miro_delete_shapes(shape_ids)
+        if page and 'data' in page and len(page['data']) > 0:
+            items.extend(page['data'])
         else:
             break
 
-        if 'cursor' in items:
-            iter_cursor = items['cursor']
+        if 'cursor' in page:
+            iter_cursor = page['cursor']
         else:
             break
+
+    return items
+
+
+def miro_get_all_shapes(board_id):
+    return miro_get_all_items(items_url(board_id), item_type="shape")
+
+
+def miro_get_all_frames(board_id):
+    return miro_get_all_items(items_url(board_id), item_type="frame")
+
+
+def miro_get_all_connectors(board_id):
+    return miro_get_all_items(connectors_url(board_id))
@@ -0,0 +1,107 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all the worker threads of a service.
+
+    The bucket is refilled continuously with `limit` credits per window
+    and is corrected from the rate limit headers of every response, so
+    the workers are paced before the server starts answering with 429.
+    """
+
+    def __init__(self, limit, window_seconds=60):
+        if limit <= 0:
+            raise ValueError(f"Invalid rate limit {limit}, must be positive")
+
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+        self._tokens = float(limit)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+
+        self._tokens = min(
+                float(self.limit),
+                self._tokens + elapsed * self.limit / self.window_seconds)
+
+    def acquire(self, credits):
+        """
+        Block until the request of the given cost can be sent, a request
+        costing more than the whole limit waits for a full bucket.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                # the bucket never holds more than the limit
+                credits = min(credits, self.limit)
+
+                if now < self._paused_until:
+                    wait_seconds = self._paused_until - now
+                elif self._tokens >= credits:
+                    self._tokens -= credits
+                    return
+                else:
+                    wait_seconds = (credits - self._tokens) * \
+                                   self.window_seconds / self.limit
+
+            time.sleep(wait_seconds)
+
+    def pause(self, seconds):
+        """
+        Stop all the workers for the given time, e.g. on Retry-After.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until,
+                                     time.monotonic() + seconds)
+
+    def update_from_headers(self, limit, remaining, reset_at):
+        """
+        :param limit: credits per window reported by the server
+        :param remaining: credits left in the current window
+        :param reset_at: unix time when the window is reset
+        """
+        with self._lock:
+            if limit:
+                self.limit = limit
+
+            if remaining is not None:
+                self._refill(time.monotonic())
+                self._tokens = min(self._tokens, float(remaining))
+
+                if remaining <= 0 and reset_at:
+                    self._paused_until = max(
+                            self._paused_until,
+                            time.monotonic() + max(0.0,
+                                                   reset_at - time.time()))
+
+
+def backoff_delay(attempt, base_seconds, max_seconds, hint_seconds=None):
+    """
+    Jittered exponential delay, never shorter than the server hint.
+
+    :param attempt: 1 based retry number
+    :param base_seconds:
+    :param max_seconds:
+    :param hint_seconds: e.g. the Retry-After header
+    :return: seconds to sleep
+    """
+    delay = min(max_seconds, base_seconds * 2 ** (attempt - 1))
+    delay = random.uniform(delay / 2, delay)
+
+    if hint_seconds is not None:
+        delay = max(delay, hint_seconds + random.uniform(0, base_seconds))
+
+    return delay
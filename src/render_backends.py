@@ -0,0 +1,281 @@
+import concurrent.futures
+import html
+import json
+import logging
+import os
+import re
+import time
+
+from board_config import BoardConfig, BoardRegion
+from board_frame_swap import board_bounds, swap_board_frame
+from board_reconciler import DesiredBoard, reconcile_board
+from config import (
+    BOARD_RENDER_MODE,
+    BOARD_RENDER_WORKERS,
+    RENDER_BACKEND,
+    RENDER_OUTPUT_DIR,
+    RENDER_OUTPUT_FORMATS,
+)
+from metrics import phase
+
+logger = logging.getLogger(__name__)
+
+BOARD_PLAN_VERSION = 1
+
+SVG_MARGIN = 100
+
+SVG_LINE_HEIGHT = 20
+
+SVG_TEXT_PADDING = 25
+
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+class MiroRenderBackend:
+    """
+    Apply the planned boards to Miro, in the BOARD_RENDER_MODE.
+    """
+
+    def render(self, board, desired_board):
+        with phase('upload'):
+            if BOARD_RENDER_MODE == 'frame_swap':
+                swap_board_frame(board, desired_board)
+            else:
+                reconcile_board(board, desired_board)
+
+
+class OfflineRenderBackend:
+    """
+    Write the planned boards to files instead of Miro, no Miro request is
+    made: a JSON plan which can be replayed to Miro later and an SVG
+    preview.
+    """
+
+    def __init__(self, output_dir, formats=('json', 'svg')):
+        self.output_dir = output_dir
+        self.formats = formats
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def render(self, board, desired_board):
+        file_root = os.path.join(self.output_dir, board_plan_name(board))
+
+        if 'json' in self.formats:
+            write_file(f"{file_root}.json",
+                       json.dumps(board_plan(board, desired_board)))
+
+        if 'svg' in self.formats:
+            write_file(f"{file_root}.svg", board_svg(desired_board))
+
+        logger.info(f"Board {board.board_id} planned in {file_root}, "
+                    f"shapes: {len(desired_board.shapes)}, "
+                    f"connectors: {len(desired_board.connectors)}")
+
+
+def create_render_backend():
+    if RENDER_BACKEND == 'offline':
+        return OfflineRenderBackend(RENDER_OUTPUT_DIR,
+                                    formats=RENDER_OUTPUT_FORMATS)
+
+    return MiroRenderBackend()
+
+
+def write_file(file_name, text):
+    tmp_file = f"{file_name}.tmp"
+
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+
+    os.replace(tmp_file, file_name)
+
+
+def board_plan_name(board):
+    name = re.sub(r'[^A-Za-z0-9_-]', '_', board.board_id)
+
+    if board.shard_count > 1:
+        name += f"-shard-{board.shard_index}"
+
+    return f"board-{name}"
+
+
+def board_plan(board, desired_board):
+    """
+    Everything needed to render the board again without fetching anything:
+    the board, its shapes payloads by key and its connectors.
+    """
+    region = {"left": board.region.left, "width": board.region.width} \
+        if board.region is not None else None
+
+    return {
+        "version": BOARD_PLAN_VERSION,
+        "board": {
+            "board_id": board.board_id,
+            "repos": board.repos,
+            "branches": board.branches,
+            "shape_color_no_tickets": board.shape_color_no_tickets,
+            "shape_color_tickets": board.shape_color_tickets,
+            "state_file": board.state_file,
+            "shard_index": board.shard_index,
+            "shard_count": board.shard_count,
+            "region": region,
+        },
+        "shapes": desired_board.shapes,
+        "connectors": desired_board.connectors,
+    }
+
+
+def load_board_plan(plan_file):
+    """
+    :param plan_file: JSON written by the offline backend
+    :return: BoardConfig and DesiredBoard
+    """
+    with open(plan_file, 'r') as f:
+        plan = json.load(f)
+
+    if plan.get("version") != BOARD_PLAN_VERSION:
+        raise ValueError(f"Unsupported board plan version "
+                         f"{plan.get('version')} in {plan_file}")
+
+    board_data = plan["board"]
+    region = board_data["region"]
+
+    board = BoardConfig(
+            board_data["board_id"], board_data["repos"],
+            board_data["branches"],
+            shape_color_no_tickets=board_data["shape_color_no_tickets"],
+            shape_color_tickets=board_data["shape_color_tickets"],
+            state_file=board_data["state_file"],
+            shard_index=board_data["shard_index"],
+            shard_count=board_data["shard_count"],
+            region=BoardRegion(region["left"], region["width"])
+            if region is not None else None)
+
+    desired_board = DesiredBoard()
+    desired_board.shapes = plan["shapes"]
+    desired_board.connectors = [tuple(connector)
+                                for connector in plan["connectors"]]
+
+    return board, desired_board
+
+
+def replay_board_plan(plan_file, render_backend):
+    board, desired_board = load_board_plan(plan_file)
+
+    started_at = time.perf_counter()
+    render_backend.render(board, desired_board)
+
+    logger.info(f"Replayed {plan_file} to board {board.board_id} in "
+                f"{time.perf_counter() - started_at:.2f}s")
+
+
+def replay_board_plans(plan_files, render_backend=None):
+    """
+    Push saved board plans, e.g. to Miro, without fetching anything. The
+    plans are rendered concurrently on BOARD_RENDER_WORKERS threads, the
+    Miro requests of all of them go through the same bulk creates,
+    concurrency limits and rate limiter as a board cycle.
+
+    :param plan_files: JSON plans written by the offline backend
+    :param render_backend: MiroRenderBackend when None
+    """
+    if render_backend is None:
+        render_backend = MiroRenderBackend()
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(BOARD_RENDER_WORKERS, len(plan_files))),
+            thread_name_prefix='replay') as executor:
+        futures = [executor.submit(replay_board_plan, plan_file,
+                                   render_backend)
+                   for plan_file in plan_files]
+
+    for future in futures:
+        future.result()
+
+
+def shape_text_lines(content):
+    """
+    :param content: HTML text of a shape
+    :return: plain text lines
+    """
+    content = content.replace('\n', '').replace('<br/>', '\n')
+
+    return [html.unescape(HTML_TAG_PATTERN.sub('', line))
+            for line in content.split('\n')]
+
+
+def svg_shape(shape_payload):
+    x = shape_payload['position']['x']
+    y = shape_payload['position']['y']
+    width = shape_payload['geometry']['width']
+    height = shape_payload['geometry']['height']
+    style = shape_payload['style']
+
+    left, top = x - width / 2, y - height / 2
+
+    elements = [
+        f'<rect x="{left}" y="{top}" width="{width}" height="{height}" '
+        f'rx="10" fill="{style.get("fillColor", "#ffffff")}" '
+        f'stroke="{style["borderColor"]}" '
+        f'stroke-width="{style["borderWidth"]}"/>'
+    ]
+
+    lines = shape_text_lines(shape_payload['data']['content'])
+
+    # the lines past the height are not visible on Miro either
+    max_lines = max(1, int((height - 2 * SVG_TEXT_PADDING) //
+                           SVG_LINE_HEIGHT) + 1)
+    lines = lines[:max_lines]
+
+    if style['textAlign'] == 'center':
+        text_x, anchor = x, 'middle'
+    else:
+        text_x, anchor = left + SVG_TEXT_PADDING / 2, 'start'
+
+    text_top = y - (len(lines) - 1) * SVG_LINE_HEIGHT / 2
+
+    for i, line in enumerate(lines):
+        elements.append(
+                f'<text x="{text_x}" y="{text_top + i * SVG_LINE_HEIGHT}" '
+                f'text-anchor="{anchor}" dominant-baseline="middle">'
+                f'{html.escape(line)}</text>')
+
+    return elements
+
+
+def board_svg(desired_board):
+    """
+    :param desired_board:
+    :return: SVG preview of the shapes and their connectors
+    """
+    if not desired_board.shapes:
+        return '<svg xmlns="http://www.w3.org/2000/svg"/>\n'
+
+    min_x, min_y, max_x, max_y = board_bounds(desired_board)
+
+    elements = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="{min_x - SVG_MARGIN} {min_y - SVG_MARGIN} '
+        f'{max_x - min_x + 2 * SVG_MARGIN} {max_y - min_y + 2 * SVG_MARGIN}" '
+        f'font-family="sans-serif" font-size="12">'
+    ]
+
+    shapes = desired_board.shapes
+
+    # the shapes of a row are connected from left to right
+    for start_key, end_key in desired_board.connectors:
+        start, end = shapes[start_key], shapes[end_key]
+
+        start_x = start['position']['x'] + start['geometry']['width'] / 2
+        end_x = end['position']['x'] - end['geometry']['width'] / 2
+
+        elements.append(
+                f'<line x1="{start_x}" y1="{start["position"]["y"]}" '
+                f'x2="{end_x}" y2="{end["position"]["y"]}" '
+                f'stroke="#000000" stroke-width="2"/>')
+
+    for shape_payload in shapes.values():
+        elements.extend(svg_shape(shape_payload))
+
+    elements.append('</svg>')
+
+    return '\n'.join(elements) + '\n'
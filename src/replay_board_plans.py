@@ -0,0 +1,33 @@
+"""
+Push board plans written by RENDER_BACKEND=offline to Miro.
+
+Usage:
+    python src/replay_board_plans.py board-plans/*.json
+"""
+import logging
+import sys
+import time
+
+from render_backends import replay_board_plans
+
+logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S%z",
+)
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    plan_files = sys.argv[1:]
+
+    if not plan_files:
+        sys.exit(__doc__)
+
+    started_at = time.perf_counter()
+
+    replay_board_plans(plan_files)
+
+    logger.info(f"Replayed {len(plan_files)} board plans in "
+                f"{time.perf_counter() - started_at:.2f}s")
@@ -0,0 +1,108 @@
+import logging
+import time
+
+from git_graphql_utils import get_repos_fingerprints
+
+logger = logging.getLogger(__name__)
+
+
+class RepoPollState:
+    def __init__(self, fingerprint, interval_seconds, next_check_at):
+        self.fingerprint = fingerprint
+        self.interval_seconds = interval_seconds
+        self.next_check_at = next_check_at
+
+
+class RepoChangeDetector:
+    """
+    Tells which repos moved since they were last fetched, from the head
+    commits of the branches and the open pull requests read with a few
+    cheap GraphQL queries.
+
+    Every repo has its own polling interval: it is reset to the base one
+    when the repo changed and doubled up to the max one while it is idle,
+    the repos which are not due are not checked at all. The idle repos are
+    still fetched once per max interval.
+    """
+
+    def __init__(self, branches, base_interval_seconds, max_interval_seconds,
+                 pr_branches=None):
+        """
+        :param branches: the branches whose heads are compared
+        :param base_interval_seconds:
+        :param max_interval_seconds:
+        :param pr_branches: the branches whose open pull requests are shown,
+                            the first branch when None
+        """
+        self.branches = branches
+        self.pr_branches = pr_branches or branches[:1]
+        self.base_interval_seconds = base_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+
+        self.states = {}
+        self._pending_states = {}
+
+    def due_repos(self, repos, now):
+        return [repo for repo in repos
+                if repo not in self.states or
+                now >= self.states[repo].next_check_at]
+
+    def check(self, repos):
+        """
+        :param repos:
+        :return: the repos to fetch again, the new fingerprints are kept
+                 only after confirm()
+        """
+        now = time.time()
+
+        due_repos = self.due_repos(repos, now)
+
+        repo_to_fingerprint = get_repos_fingerprints(due_repos,
+                                                     self.branches,
+                                                     self.pr_branches) \
+            if due_repos else {}
+
+        changed_repos = []
+        self._pending_states = {}
+
+        for repo in due_repos:
+            fingerprint = repo_to_fingerprint.get(repo)
+            state = self.states.get(repo)
+
+            if fingerprint is None:
+                # fetch it as usual and check it again on the next cycle
+                changed_repos.append(repo)
+                continue
+
+            if state is None or state.fingerprint != fingerprint:
+                changed_repos.append(repo)
+                interval_seconds = self.base_interval_seconds
+            else:
+                if state.interval_seconds >= self.max_interval_seconds:
+                    # refresh the idle repos now and then, so a failed
+                    # fetch is not kept forever
+                    changed_repos.append(repo)
+
+                interval_seconds = min(self.max_interval_seconds,
+                                       max(1, state.interval_seconds * 2))
+
+            self._pending_states[repo] = RepoPollState(
+                    fingerprint, interval_seconds, now + interval_seconds)
+
+        logger.info(f"Repos checked: {len(due_repos)} of {len(repos)}, "
+                    f"changed: {len(changed_repos)}")
+
+        return changed_repos
+
+    def confirm(self, failed_repos=()):
+        """
+        Keep the fingerprints of the last check, once its repos are fetched.
+
+        :param failed_repos: repos which could not be fetched, they are
+                             checked again on the next cycle
+        """
+        for repo in failed_repos:
+            self._pending_states.pop(repo, None)
+
+        self.states.update(self._pending_states)
+        self._pending_states = {}
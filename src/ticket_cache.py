@@ -0,0 +1,121 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TicketCache:
+    """
+    LRU cache of ticket values with TTL, shared between the loop iterations.
+
+    The cache also remembers when it was last synced with Jira, so only the
+    tickets updated after that moment need to be refreshed.
+
+    The cache file is ignored when it was written with another cache_format,
+    e.g. by a version caching other values.
+    """
+
+    def __init__(self, max_size, ttl_seconds, cache_file=None,
+                 cache_format=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.cache_file = cache_file
+        self.cache_format = cache_format
+        self.last_sync = None
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.load()
+
+    def get(self, ticket_id):
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, fetched_at = entry
+
+            if time.time() - fetched_at > self.ttl_seconds:
+                del self._entries[ticket_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(ticket_id)
+            self.hits += 1
+
+            return value
+
+    def put(self, ticket_id, value, fetched_at=None):
+        with self._lock:
+            self._entries[ticket_id] = (value, fetched_at or time.time())
+            self._entries.move_to_end(ticket_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update_if_present(self, ticket_id, value):
+        with self._lock:
+            if ticket_id not in self._entries:
+                return False
+
+        self.put(ticket_id, value)
+        return True
+
+    def ticket_ids(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def load(self):
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load ticket cache "
+                           f"{self.cache_file}: {e}")
+            return
+
+        if data.get("format") != self.cache_format:
+            logger.info(f"Ticket cache {self.cache_file} has another format, "
+                        f"ignore it")
+            return
+
+        self.last_sync = data.get("last_sync")
+
+        for ticket_id, (value, fetched_at) in data.get("entries", {}).items():
+            self.put(ticket_id, value, fetched_at=fetched_at)
+
+        logger.info(f"Loaded {len(self)} tickets from {self.cache_file}")
+
+    def save(self):
+        if not self.cache_file:
+            return
+
+        with self._lock:
+            data = {
+                "format": self.cache_format,
+                "last_sync": self.last_sync,
+                "entries": dict(self._entries),
+            }
+
+        tmp_file = self.cache_file + ".tmp"
+
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f)
+
+        os.replace(tmp_file, self.cache_file)
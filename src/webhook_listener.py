@@ -0,0 +1,246 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from config import (
+    GITHUB_OWNER,
+    GITHUB_WEBHOOK_SECRET,
+    JIRA_WEBHOOK_SECRET,
+    WEBHOOK_DEBOUNCE_SECONDS,
+    WEBHOOK_MAX_DELAY_SECONDS,
+)
+from jira_utils import update_jira_ticket
+
+logger = logging.getLogger(__name__)
+
+GITHUB_PULL_REQUEST_ACTIONS = {'opened', 'closed', 'reopened', 'edited'}
+
+JIRA_ISSUE_EVENTS = {'jira:issue_created', 'jira:issue_updated'}
+
+
+class BoardChanges:
+    def __init__(self):
+        self.repos = set()
+        self.ticket_ids = set()
+
+
+class ChangeDebouncer:
+    """
+    Collects the changes reported by the webhooks, they are handed over
+    only when no new change arrived for the debounce time, so a burst of
+    events ends in a single render. A steady stream of events is handed
+    over at the latest max_delay_seconds after its first change.
+    """
+
+    def __init__(self, debounce_seconds, max_delay_seconds):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+        self._changes = BoardChanges()
+        self._first_change_at = None
+        self._last_change_at = None
+        self._condition = threading.Condition()
+
+    def add(self, repos=(), ticket_ids=()):
+        with self._condition:
+            self._changes.repos.update(repos)
+            self._changes.ticket_ids.update(ticket_ids)
+            self._last_change_at = time.monotonic()
+
+            if self._first_change_at is None:
+                self._first_change_at = self._last_change_at
+            self._condition.notify_all()
+
+    def clear(self):
+        """
+        Drop the pending changes, e.g. when the whole board is rendered.
+        """
+        with self._condition:
+            self._changes = BoardChanges()
+            self._first_change_at = None
+            self._last_change_at = None
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: max seconds to wait, None waits forever
+        :return: BoardChanges or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait_seconds = None
+
+                if self._last_change_at is not None:
+                    ready_at = min(
+                            self._last_change_at + self.debounce_seconds,
+                            self._first_change_at + self.max_delay_seconds)
+
+                    if now >= ready_at:
+                        changes = self._changes
+                        self._changes = BoardChanges()
+                        self._first_change_at = None
+                        self._last_change_at = None
+                        return changes
+
+                    wait_seconds = ready_at - now
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+
+                    wait_seconds = deadline - now if wait_seconds is None \
+                        else min(wait_seconds, deadline - now)
+
+                self._condition.wait(wait_seconds)
+
+
+def is_valid_signature(secret, body, signature):
+    """
+    Check https://docs.github.com/en/webhooks/using-webhooks/validating-webhook-deliveries
+
+    :param secret: shared secret of the webhook, nothing is valid without it
+    :param body: raw request body
+    :param signature: `sha256=...` header value
+    :return:
+    """
+    if not secret or not signature:
+        return False
+
+    expected = 'sha256=' + hmac.new(secret.encode(), body,
+                                    hashlib.sha256).hexdigest()
+
+    return hmac.compare_digest(expected, signature)
+
+
+def github_event_repos(event, payload, repos, branches):
+    """
+    :param event: X-GitHub-Event header value
+    :param payload:
+    :param repos: repos on the boards
+    :param branches: branches on the boards
+    :return: the repos on the boards affected by the GitHub event
+    """
+    repository = payload.get('repository') or {}
+    owner = (repository.get('owner') or {}).get('login', '')
+    repo = repository.get('name')
+
+    if owner.lower() != (GITHUB_OWNER or '').lower() or repo not in repos:
+        return []
+
+    if event == 'push':
+        # pushes to other branches do not change the compares
+        if payload.get('ref') in [f"refs/heads/{branch}"
+                                  for branch in branches]:
+            return [repo]
+
+    if event == 'pull_request':
+        if payload.get('action') in GITHUB_PULL_REQUEST_ACTIONS:
+            return [repo]
+
+    return []
+
+
+def jira_event_ticket_ids(payload):
+    """
+    The issue of the event is stored in the ticket cache at once, the
+    board is rendered without asking Jira again.
+
+    :return: the changed ticket ids
+    """
+    if payload.get('webhookEvent') not in JIRA_ISSUE_EVENTS:
+        return []
+
+    issue = payload.get('issue') or {}
+    fields = issue.get('fields') or {}
+
+    if not issue.get('key'):
+        return []
+
+    status = (fields.get('status') or {}).get('name', '')
+
+    update_jira_ticket(issue['key'], fields.get('summary', ''), status)
+
+    return [issue['key']]
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    debouncer = None
+    repos = set()
+    branches = []
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if self.path == '/webhooks/github':
+            secret = GITHUB_WEBHOOK_SECRET
+            signature = self.headers.get('X-Hub-Signature-256')
+        elif self.path == '/webhooks/jira':
+            secret = JIRA_WEBHOOK_SECRET
+            signature = self.headers.get('X-Hub-Signature')
+        else:
+            return self.reply(404)
+
+        if not is_valid_signature(secret, body, signature):
+            logger.warning(f"Rejected webhook with invalid signature: "
+                           f"{self.path}")
+            return self.reply(403)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.reply(400)
+
+        if self.path == '/webhooks/github':
+            repos = github_event_repos(self.headers.get('X-GitHub-Event'),
+                                       payload, self.repos, self.branches)
+            ticket_ids = []
+        else:
+            repos = []
+            ticket_ids = jira_event_ticket_ids(payload)
+
+        if not repos and not ticket_ids:
+            return self.reply(204)
+
+        logger.info(f"Webhook changes, repos: {repos}, "
+                    f"tickets: {ticket_ids}")
+
+        self.debouncer.add(repos=repos, ticket_ids=ticket_ids)
+
+        self.reply(202)
+
+
+def start_webhook_listener(port, repos, branches):
+    """
+    :param port:
+    :param repos: repos on the boards, the events of other repos are ignored
+    :param branches: branches on the boards
+    :return: ChangeDebouncer with the changes reported by the webhooks
+    """
+    WebhookHandler.debouncer = ChangeDebouncer(WEBHOOK_DEBOUNCE_SECONDS,
+                                               WEBHOOK_MAX_DELAY_SECONDS)
+    WebhookHandler.repos = set(repos)
+    WebhookHandler.branches = list(branches)
+
+    server = ThreadingHTTPServer(('', port), WebhookHandler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, name='webhooks',
+                     daemon=True).start()
+
+    logger.info(f"Listening for webhooks on port {port}")
+
+    return WebhookHandler.debouncer
@@ -0,0 +1,66 @@
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from board_reconciler import DesiredBoard, match_board_shapes  # noqa
+
+
+def live_shape(shape_id, shape_payload):
+    """
+    A shape as read back from the board, with the payload it was created
+    from.
+    """
+    return dict(copy.deepcopy(shape_payload), id=shape_id, type="shape")
+
+
+class MatchBoardShapesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.desired_board = DesiredBoard()
+        self.shape_payload = self.desired_board.add_shape(
+                "repo:r1", 0, 100, "r1", color="#ffccCB")
+
+    def test_unchanged_shape_is_matched(self):
+        known_shapes = {}
+
+        match_board_shapes(self.desired_board,
+                           [live_shape("1", self.shape_payload)],
+                           {"1"}, known_shapes)
+
+        self.assertEqual(known_shapes["repo:r1"]["id"], "1")
+
+    def test_color_case_is_ignored(self):
+        shape = live_shape("1", self.shape_payload)
+        shape["style"]["fillColor"] = "#FFCCCB"
+
+        known_shapes = {}
+
+        match_board_shapes(self.desired_board, [shape], {"1"}, known_shapes)
+
+        self.assertEqual(known_shapes["repo:r1"]["id"], "1")
+
+    def test_changed_color_is_not_matched(self):
+        shape = live_shape("1", self.shape_payload)
+        shape["style"]["fillColor"] = "#FFFFFF"
+
+        known_shapes = {}
+
+        match_board_shapes(self.desired_board, [shape], {"1"}, known_shapes)
+
+        self.assertEqual(known_shapes, {})
+
+    def test_not_owned_shape_is_not_matched(self):
+        known_shapes = {}
+
+        match_board_shapes(self.desired_board,
+                           [live_shape("1", self.shape_payload)],
+                           set(), known_shapes)
+
+        self.assertEqual(known_shapes, {})
+
+
+if __name__ == '__main__':
+    unittest.main()